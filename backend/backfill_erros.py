@@ -0,0 +1,47 @@
+import argparse
+from database import supabase
+
+# ==============================================================================
+# 🔁 BACKFILL do estado por questão (user_question_state)
+# ==============================================================================
+# Recalcula o estado de cada par (usuário, questão) a partir do user_history,
+# em janelas de ids de questão (cada janela é uma chamada curta à RPC
+# backfill_user_question_state).
+# Rode DEPOIS de aplicar database/create_user_question_state.sql: o trigger já
+# cobre as tentativas novas e o backfill cuida do passado.
+#
+# Uso: python backfill_erros.py [--questoes-por-janela 500]
+# ==============================================================================
+
+
+def maior_id_questao():
+    resp = supabase.table("questions").select("id").order("id", desc=True).limit(1).execute()
+    return resp.data[0]['id'] if resp.data else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill do estado por questão (caderno de erros).")
+    parser.add_argument("--questoes-por-janela", type=int, default=500)
+    args = parser.parse_args()
+
+    maior = maior_id_questao()
+    if maior is None:
+        print("⚠️ Tabela questions vazia. Nada para fazer.")
+        return
+
+    print(f"🔁 Backfill das questões 1 a {maior} em janelas de {args.questoes_por_janela}...")
+
+    total = 0
+    inicio = 1
+    while inicio <= maior:
+        ate = inicio + args.questoes_por_janela
+        resp = supabase.rpc("backfill_user_question_state", {"p_de": inicio, "p_ate": ate}).execute()
+        total += resp.data or 0
+        print(f"   ✅ questões {inicio} → {ate - 1}: {resp.data} pares")
+        inicio = ate
+
+    print(f"\n🎉 Backfill concluído: {total} pares (usuário, questão) gravados.")
+
+
+if __name__ == "__main__":
+    main()
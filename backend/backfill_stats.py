@@ -0,0 +1,52 @@
+import argparse
+from datetime import date, datetime, timedelta, timezone
+from database import supabase
+
+# ==============================================================================
+# 🔁 BACKFILL do rollup user_stats_daily
+# ==============================================================================
+# Recalcula os baldes diários a partir do user_history, em janelas de N dias
+# (cada janela é uma chamada curta à RPC backfill_user_stats_daily).
+# Rode DEPOIS de aplicar database/create_user_stats_daily.sql: o trigger já
+# cobre as tentativas novas e o backfill cuida do passado.
+#
+# Uso: python backfill_stats.py [--desde 2025-01-01] [--dias-por-janela 7]
+# ==============================================================================
+
+
+def primeira_tentativa():
+    resp = supabase.table("user_history").select("created_at").order("created_at").limit(1).execute()
+    if not resp.data:
+        return None
+    return datetime.fromisoformat(resp.data[0]['created_at']).astimezone(timezone.utc).date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill do rollup user_stats_daily.")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Primeiro dia (padrão: a tentativa mais antiga)")
+    parser.add_argument("--dias-por-janela", type=int, default=7)
+    args = parser.parse_args()
+
+    desde = args.desde or primeira_tentativa()
+    if not desde:
+        print("⚠️ user_history vazio. Nada para fazer.")
+        return
+
+    # Vai até amanhã (UTC) para incluir o dia de hoje inteiro
+    fim = datetime.now(timezone.utc).date() + timedelta(days=1)
+    print(f"🔁 Backfill de {desde} até {fim - timedelta(days=1)} em janelas de {args.dias_por_janela} dias...")
+
+    total_baldes = 0
+    inicio = desde
+    while inicio < fim:
+        ate = min(fim, inicio + timedelta(days=args.dias_por_janela))
+        resp = supabase.rpc("backfill_user_stats_daily", {"p_desde": inicio.isoformat(), "p_ate": ate.isoformat()}).execute()
+        total_baldes += resp.data or 0
+        print(f"   ✅ {inicio} → {ate}: {resp.data} baldes")
+        inicio = ate
+
+    print(f"\n🎉 Backfill concluído: {total_baldes} baldes gravados.")
+
+
+if __name__ == "__main__":
+    main()
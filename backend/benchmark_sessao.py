@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from database import supabase
+from motor_selecao import CandidatasIlha
+
+# ==============================================================================
+# ⏱️ BENCHMARK: Seleção da sessão (Python x candidatas colunares + motor)
+# ==============================================================================
+# Compara o caminho antigo do get_sessao_treino (baixa todo o user_history +
+# todas as questões da ilha e filtra em Python) com o atual: RPC
+# get_candidatas_sessao + sorteio do motor_selecao + busca das escolhidas.
+#
+# Uso:
+#   BENCH_USER_ID=<uuid de um usuário de teste> python benchmark_sessao.py [questoes_na_ilha] [dificuldade]
+#
+# O script cria uma ilha descartável com questões sintéticas e insere histórico
+# sintético (1k, 10k e 100k linhas) do usuário de teste só nessas questões: os
+# triggers de user_history não tocam contadores de questões reais. No final
+# APAGA a ilha, as questões (question_stats vai junto), o histórico e os
+# derivados do usuário de teste. Não use uma conta real.
+# ==============================================================================
+
+TAMANHOS = [1_000, 10_000, 100_000]
+REPETICOES = 5
+QUESTOES_ILHA = 300
+QUANTIDADE = 5
+LOTE = 1000
+
+
+def _bytes(dados):
+    return len(json.dumps(dados, default=str).encode("utf-8"))
+
+
+def _buscar_paginado(query_fn):
+    """O PostgREST corta em 1000 linhas; o caminho antigo precisaria paginar para ser correto."""
+    linhas, inicio = [], 0
+    while True:
+        resp = query_fn().range(inicio, inicio + LOTE - 1).execute()
+        linhas.extend(resp.data)
+        if len(resp.data) < LOTE:
+            return linhas
+        inicio += LOTE
+
+
+def caminho_antigo(user_id, ilha_id, dificuldade):
+    hist = _buscar_paginado(lambda: supabase.table("user_history").select("question_id").eq("user_id", user_id))
+    questoes = _buscar_paginado(lambda: supabase.table("questions").select("*")
+                                .eq("lesson_id", ilha_id).eq("dificuldade", dificuldade))
+    respondidas = {h["question_id"] for h in hist}
+    ineditas = [q for q in questoes if q["id"] not in respondidas]
+    sessao = random.sample(ineditas, min(QUANTIDADE, len(ineditas)))
+    return sessao, _bytes(hist) + _bytes(questoes)
+
+
+def caminho_candidatas(user_id, ilha_id, dificuldade):
+    """Mesmo caminho do get_sessao_treino (selecionar_do_estoque) para um nível fixo."""
+    colunas = supabase.rpc("get_candidatas_sessao", {
+        "p_user_id": user_id,
+        "p_lesson_id": ilha_id
+    }).execute()
+    ids = CandidatasIlha(colunas.data or {}).sortear(QUANTIDADE, dificuldade)
+    sessao = []
+    if ids:
+        sessao = supabase.table("questions").select("*").in_("id", ids).execute().data
+    return sessao, _bytes(colunas.data) + _bytes(sessao)
+
+
+def medir(fn, *args):
+    tempos, payload = [], 0
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        _, payload = fn(*args)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), payload
+
+
+def semear_historico(user_id, ids_questoes, total, ids_inseridos):
+    """Completa o histórico sintético até `total` linhas (guarda os ids para limpar)."""
+    faltam = total - len(ids_inseridos)
+    while faltam > 0:
+        n = min(LOTE, faltam)
+        linhas = [{"user_id": user_id, "question_id": random.choice(ids_questoes), "is_correct": random.random() < 0.6}
+                  for _ in range(n)]
+        resp = supabase.table("user_history").insert(linhas).execute()
+        ids_inseridos.extend(r["id"] for r in resp.data)
+        faltam -= n
+
+
+def criar_ilha_descartavel():
+    """Ilha só para o benchmark, pendurada na primeira trilha do banco (None se não houver trilha)."""
+    modulo = supabase.table("modules").select("id").limit(1).execute().data
+    if not modulo:
+        return None
+    return supabase.table("lessons").insert({
+        "titulo": "⏱️ Benchmark (temporária)", "module_id": modulo[0]["id"], "posicao_x": 0, "posicao_y": 0
+    }).execute().data[0]["id"]
+
+
+def semear_questoes(ilha_id, n_questoes):
+    """Questões sintéticas (níveis alternados) na ilha descartável."""
+    niveis = ["Fácil", "Médio", "Difícil"]
+    ids = []
+    for inicio in range(0, n_questoes, LOTE):
+        linhas = [{
+            "lesson_id": ilha_id,
+            "enunciado": f"Questão sintética {i} do benchmark",
+            "alternativa_a": "A", "alternativa_b": "B", "alternativa_c": "C", "alternativa_d": "D",
+            "correta": "A",
+            "explicacao": "Benchmark",
+            "dificuldade": niveis[i % len(niveis)],
+        } for i in range(inicio, min(inicio + LOTE, n_questoes))]
+        ids.extend(q["id"] for q in supabase.table("questions").insert(linhas).execute().data)
+    return ids
+
+
+def limpar(user_id, ilha_id, ids_inseridos):
+    for i in range(0, len(ids_inseridos), LOTE):
+        supabase.table("user_history").delete().in_("id", ids_inseridos[i:i + LOTE]).execute()
+    # Derivados mantidos pelos triggers de user_history (conta de teste: tudo dela é sintético)
+    for tabela in ["user_question_state", "user_question_srs", "user_lesson_ability", "user_stats_daily"]:
+        supabase.table(tabela).delete().eq("user_id", user_id).execute()
+    if ilha_id is not None:
+        supabase.table("questions").delete().eq("lesson_id", ilha_id).execute()
+        supabase.table("lessons").delete().eq("id", ilha_id).execute()
+
+
+def main():
+    user_id = os.getenv("BENCH_USER_ID")
+    if not user_id:
+        print("Uso: BENCH_USER_ID=<uuid> python benchmark_sessao.py [questoes_na_ilha] [dificuldade]")
+        return
+
+    n_questoes = int(sys.argv[1]) if len(sys.argv) > 1 else QUESTOES_ILHA
+    dificuldade = sys.argv[2] if len(sys.argv) > 2 else "Fácil"
+
+    ilha_id, ids_inseridos = None, []
+    try:
+        ilha_id = criar_ilha_descartavel()
+        if ilha_id is None:
+            print("⚠️ Banco sem trilhas. Rode o setup_inicial.py primeiro.")
+            return
+        ids_questoes = semear_questoes(ilha_id, n_questoes)
+
+        print(f"⏱️ Benchmark Ilha descartável {ilha_id} ({n_questoes} questões) | Nível {dificuldade} "
+              f"| mediana de {REPETICOES} execuções\n")
+        print(f"{'histórico':>10} | {'antigo (ms)':>12} | {'antigo (KB)':>12} | {'atual (ms)':>10} | {'atual (KB)':>10}")
+
+        for total in TAMANHOS:
+            semear_historico(user_id, ids_questoes, total, ids_inseridos)
+            ms_antigo, bytes_antigo = medir(caminho_antigo, user_id, ilha_id, dificuldade)
+            ms_atual, bytes_atual = medir(caminho_candidatas, user_id, ilha_id, dificuldade)
+            print(f"{total:>10} | {ms_antigo:>12.1f} | {bytes_antigo / 1024:>12.1f} | {ms_atual:>10.1f} | {bytes_atual / 1024:>10.1f}")
+    finally:
+        print(f"\n🧹 Removendo a ilha descartável e {len(ids_inseridos)} linhas sintéticas...")
+        limpar(user_id, ilha_id, ids_inseridos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import asyncio
+import glob
+import json
+import os
+import time
+import uuid
+from database import get_supabase_async
+
+try:
+    import fcntl  # Lock do spool de cada worker (Linux/macOS)
+except ImportError:
+    fcntl = None
+
+# ==============================================================================
+# 📮 WRITE-BEHIND DO /historico
+# ==============================================================================
+# Em vez de um INSERT por resposta, as tentativas entram numa fila limitada em
+# memória e são gravadas em lotes (por tamanho ou por tempo).
+#
+# Durabilidade: cada tentativa é anexada a um arquivo de spool ANTES do ack.
+# Um segundo arquivo (.ok) guarda até que byte do spool já foi gravado no banco.
+# Ao reiniciar, tudo depois desse ponteiro é reenfileirado.
+#
+# Um spool por processo (historico.<pid>.jsonl em HISTORICO_SPOOL_DIR), com
+# lock exclusivo enquanto o worker vive: workers do uvicorn nunca escrevem,
+# avançam ou truncam o arquivo um do outro. No start, spools sem dono (worker
+# morto) são adotados: o que faltava gravar passa para o spool novo.
+#
+# Reenvios são idempotentes: cada tentativa ganha um idempotency_key no
+# registro e o lote é gravado com ON CONFLICT DO NOTHING
+# (database/add_user_history_idempotency_key.sql), então os triggers de
+# user_history não contam duas vezes uma tentativa reenviada.
+# ==============================================================================
+
+MAX_FILA = int(os.getenv("HISTORICO_MAX_FILA", "10000"))
+TAMANHO_LOTE = int(os.getenv("HISTORICO_TAMANHO_LOTE", "200"))
+INTERVALO_FLUSH = float(os.getenv("HISTORICO_INTERVALO_FLUSH", "1.0"))  # segundos
+DIRETORIO_SPOOL = os.getenv("HISTORICO_SPOOL_DIR", "spool_historico")
+SPOOL_LEGADO = "historico_spool.jsonl"  # Arquivo único das versões anteriores (adotado no start)
+FSYNC = os.getenv("HISTORICO_SPOOL_FSYNC", "0") == "1"
+
+
+class BufferHistorico:
+    def __init__(self, diretorio_spool=DIRETORIO_SPOOL, max_fila=MAX_FILA,
+                 tamanho_lote=TAMANHO_LOTE, intervalo=INTERVALO_FLUSH):
+        self.diretorio_spool = diretorio_spool
+        self.caminho_spool = None  # Definido no iniciar(): depende do pid do worker
+        self.caminho_ponteiro = None
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._fila = asyncio.Queue(maxsize=max_fila)
+        self._spool = None
+        self._tarefa = None
+        self._falhas_seguidas = 0
+        self._pendente = []  # Em voo, que falhou ou veio do spool: gravado antes de puxar mais da fila
+        self.metricas = {
+            "enfileiradas": 0,
+            "gravadas": 0,
+            "lotes": 0,
+            "falhas_flush": 0,
+            "recusadas_fila_cheia": 0,
+            "recuperadas_spool": 0,
+            "ultima_latencia_ms": 0.0,
+            "max_latencia_ms": 0.0,
+            "soma_latencia_ms": 0.0,
+        }
+
+    # --- Ciclo de vida ---
+    async def iniciar(self):
+        os.makedirs(self.diretorio_spool, exist_ok=True)
+        self.caminho_spool = os.path.join(self.diretorio_spool, f"historico.{os.getpid()}.jsonl")
+        self.caminho_ponteiro = self.caminho_spool + ".ok"
+        self._recuperar_spool()
+        self._spool = open(self.caminho_spool, "a", encoding="utf-8")
+        if fcntl:
+            fcntl.flock(self._spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._adotar_orfaos()
+        self._tarefa = asyncio.create_task(self._loop())
+        print(f"📮 Write-behind do histórico ativo (lote {self.tamanho_lote} | {self.intervalo}s | fila {self._fila.maxsize})")
+
+    async def parar(self):
+        """Hook de desligamento: para o loop e grava tudo o que ainda está na fila."""
+        if self._tarefa:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+        self._pendente += self._drenar(self._fila.qsize())
+        while self._pendente:
+            lote = self._pendente[:self.tamanho_lote]
+            if not await self._gravar(lote):
+                print("   ⚠️ Flush final falhou; as tentativas continuam no spool para o próximo start.")
+                break
+            self._pendente = self._pendente[len(lote):]
+            self._confirmar(lote[-1][1])
+        if self._spool:
+            self._spool.close()
+        print(f"📮 Write-behind encerrado. {self.metricas['gravadas']} tentativas gravadas nesta execução.")
+
+    # --- Entrada ---
+    def registrar(self, tentativa):
+        """
+        Anexa no spool e enfileira. Retorna False se a fila estiver cheia
+        (a rota então grava direto, sem perder a tentativa).
+        """
+        if self._fila.full():
+            self.metricas["recusadas_fila_cheia"] += 1
+            return False
+        tentativa.setdefault("idempotency_key", str(uuid.uuid4()))
+        linha = json.dumps(tentativa, ensure_ascii=False) + "\n"
+        self._spool.write(linha)
+        self._spool.flush()
+        if FSYNC:
+            os.fsync(self._spool.fileno())
+        self._fila.put_nowait((tentativa, self._spool.tell()))
+        self.metricas["enfileiradas"] += 1
+        return True
+
+    def snapshot_metricas(self):
+        lotes = self.metricas["lotes"]
+        return {
+            **{k: v for k, v in self.metricas.items() if k != "soma_latencia_ms"},
+            "profundidade_fila": self._fila.qsize() + len(self._pendente),
+            "latencia_media_ms": round(self.metricas["soma_latencia_ms"] / lotes, 2) if lotes else 0.0,
+        }
+
+    # --- Flush ---
+    def _drenar(self, limite):
+        itens = []
+        while len(itens) < limite and not self._fila.empty():
+            itens.append(self._fila.get_nowait())
+        return itens
+
+    async def _loop(self):
+        while True:
+            if self._pendente:
+                # Primeiro o que falhou antes ou veio do spool, na ordem original
+                lote = self._pendente[:self.tamanho_lote]
+            else:
+                # Espera o primeiro item, depois junta o que chegar até encher o lote ou vencer o intervalo
+                lote = [await self._fila.get()]
+                prazo = time.monotonic() + self.intervalo
+                while len(lote) < self.tamanho_lote:
+                    lote.extend(self._drenar(self.tamanho_lote - len(lote)))
+                    restante = prazo - time.monotonic()
+                    if len(lote) >= self.tamanho_lote or restante <= 0:
+                        break
+                    try:
+                        lote.append(await asyncio.wait_for(self._fila.get(), timeout=restante))
+                    except asyncio.TimeoutError:
+                        break
+                self._pendente = lote
+
+            if await self._gravar(lote):
+                self._falhas_seguidas = 0
+                self._pendente = self._pendente[len(lote):]
+                self._confirmar(lote[-1][1])
+            else:
+                # Banco fora: backoff exponencial (até 30s) sem perder o lote
+                self._falhas_seguidas += 1
+                await asyncio.sleep(min(30, 2 ** self._falhas_seguidas))
+
+    async def _gravar(self, lote):
+        inicio = time.perf_counter()
+        try:
+            db = await get_supabase_async()
+            # Reenvio (spool, lote que falhou no meio) não duplica a tentativa
+            await db.table("user_history")\
+                .upsert([t for t, _ in lote], on_conflict="idempotency_key", ignore_duplicates=True)\
+                .execute()
+        except Exception as e:
+            self.metricas["falhas_flush"] += 1
+            print(f"   ❌ Falha ao gravar lote de {len(lote)} tentativas: {e}")
+            return False
+
+        latencia = (time.perf_counter() - inicio) * 1000
+        self.metricas["gravadas"] += len(lote)
+        self.metricas["lotes"] += 1
+        self.metricas["ultima_latencia_ms"] = round(latencia, 2)
+        self.metricas["max_latencia_ms"] = round(max(self.metricas["max_latencia_ms"], latencia), 2)
+        self.metricas["soma_latencia_ms"] += latencia
+        return True
+
+    # --- Spool ---
+    def _confirmar(self, offset):
+        """Avança o ponteiro do que já está no banco; se tudo foi gravado, zera o spool."""
+        zerar = not self._pendente and self._fila.empty() and offset >= self._spool.tell()
+        # Ponteiro primeiro, truncate depois: uma queda no meio gera no máximo
+        # linhas repetidas no próximo start, nunca tentativas perdidas.
+        temporario = self.caminho_ponteiro + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write("0" if zerar else str(offset))
+        os.replace(temporario, self.caminho_ponteiro)
+        if zerar:
+            self._spool.truncate(0)
+            self._spool.seek(0)
+
+    def _recuperar_spool(self):
+        """Reenfileira o que estava no spool depois do último ponteiro confirmado."""
+        if not os.path.exists(self.caminho_spool):
+            return
+        confirmado = 0
+        if os.path.exists(self.caminho_ponteiro):
+            with open(self.caminho_ponteiro, encoding="utf-8") as f:
+                confirmado = int(f.read().strip() or 0)
+
+        with open(self.caminho_spool, encoding="utf-8") as f:
+            f.seek(confirmado)
+            for linha in iter(f.readline, ""):
+                if not linha.endswith("\n"):
+                    break  # Linha cortada por queda no meio da escrita
+                self._pendente.append((json.loads(linha), f.tell()))
+                self.metricas["recuperadas_spool"] += 1
+
+        if self.metricas["recuperadas_spool"]:
+            print(f"📮 {self.metricas['recuperadas_spool']} tentativas recuperadas do spool.")
+
+    def _adotar_orfaos(self):
+        """
+        Spools de workers que morreram (lock livre) e o arquivo legado: o que
+        não foi confirmado passa para o spool deste worker e o órfão é apagado.
+        Uma queda no meio só gera reenvios, e reenvios são idempotentes.
+        """
+        if not fcntl:
+            return  # Sem lock não dá para saber se o dono está vivo (ex.: Windows, um worker só)
+        candidatos = glob.glob(os.path.join(self.diretorio_spool, "historico.*.jsonl"))
+        if os.path.exists(SPOOL_LEGADO):
+            candidatos.append(SPOOL_LEGADO)
+        adotadas = 0
+        for caminho in candidatos:
+            if os.path.abspath(caminho) == os.path.abspath(self.caminho_spool):
+                continue
+            with open(caminho, "r+", encoding="utf-8") as orfao:
+                try:
+                    fcntl.flock(orfao.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Worker vivo: o spool é dele
+                confirmado = 0
+                if os.path.exists(caminho + ".ok"):
+                    with open(caminho + ".ok", encoding="utf-8") as f:
+                        confirmado = int(f.read().strip() or 0)
+                orfao.seek(confirmado)
+                for linha in iter(orfao.readline, ""):
+                    if not linha.endswith("\n"):
+                        break
+                    self._spool.write(linha)
+                    self._spool.flush()
+                    self._pendente.append((json.loads(linha), self._spool.tell()))
+                    adotadas += 1
+                if FSYNC:
+                    os.fsync(self._spool.fileno())
+                os.remove(caminho)
+                if os.path.exists(caminho + ".ok"):
+                    os.remove(caminho + ".ok")
+
+        if adotadas:
+            self.metricas["recuperadas_spool"] += adotadas
+            print(f"📮 {adotadas} tentativas adotadas de spools sem dono.")
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from database import buscar_tudo
+
+# ==============================================================================
+# 🗺️ CACHE DO CURRÍCULO (Áreas → Sistemas → Trilhas → Ilhas)
+# ==============================================================================
+# A árvore criada pelo setup_inicial.py quase nunca muda, então carregamos as
+# quatro tabelas uma única vez e servimos as rotas de navegação direto da memória.
+# ==============================================================================
+
+TTL_SEGUNDOS = int(os.getenv("CURRICULO_CACHE_TTL", "3600"))
+
+
+def _agrupar(linhas, campo_pai, campo_ordem=None):
+    indice = {}
+    for linha in linhas:
+        indice.setdefault(linha.get(campo_pai), []).append(linha)
+    if campo_ordem:
+        for filhos in indice.values():
+            filhos.sort(key=lambda l: (l.get(campo_ordem) is None, l.get(campo_ordem) or 0))
+    return indice
+
+
+class CacheCurriculo:
+    """
+    Árvore do currículo em memória, indexada pelo id do pai.
+    Recarrega sozinha quando o TTL expira ou após invalidar().
+    """
+
+    def __init__(self, ttl=TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        self._carregado_em = None
+        self.versao = None
+        self.areas = []
+        self.sistemas_por_area = {}
+        self.trilhas_por_sistema = {}
+        self.ilhas_por_trilha = {}
+        self.ilhas_por_id = {}
+        self.trilhas_por_id = {}
+        self.sistemas_por_id = {}
+        self.areas_por_id = {}
+        self.caminhos_por_ilha = {}
+
+    def carregar(self):
+        """Busca as quatro tabelas (4 queries no total) e reconstrói os índices."""
+        areas = buscar_tudo("areas")
+        sistemas = buscar_tudo("systems")
+        trilhas = buscar_tudo("modules")
+        ilhas = buscar_tudo("lessons")
+
+        # A versão é o hash do conteúdo: serve de ETag para as rotas
+        bruto = json.dumps([areas, sistemas, trilhas, ilhas], sort_keys=True, default=str)
+        versao = hashlib.sha256(bruto.encode("utf-8")).hexdigest()[:16]
+
+        with self._lock:
+            self.areas = areas
+            self.sistemas_por_area = _agrupar(sistemas, "area_id")
+            self.trilhas_por_sistema = _agrupar(trilhas, "system_id", "ordem")
+            self.ilhas_por_trilha = _agrupar(ilhas, "module_id", "posicao_x")
+            self.areas_por_id = {a["id"]: a for a in areas}
+            self.sistemas_por_id = {s["id"]: s for s in sistemas}
+            self.trilhas_por_id = {t["id"]: t for t in trilhas}
+            self.ilhas_por_id = {i["id"]: i for i in ilhas}
+            self.caminhos_por_ilha = self._montar_caminhos(ilhas)
+            self.versao = versao
+            self._carregado_em = time.monotonic()
+
+        print(f"🗺️ Currículo em cache: {len(areas)} áreas | {len(sistemas)} sistemas | "
+              f"{len(trilhas)} trilhas | {len(ilhas)} ilhas (versão {versao})")
+
+    def _montar_caminhos(self, ilhas):
+        """ilha_id -> nomes da ilha, trilha, sistema e área (substitui o join aninhado)."""
+        caminhos = {}
+        for ilha in ilhas:
+            trilha = self.trilhas_por_id.get(ilha.get("module_id")) or {}
+            sistema = self.sistemas_por_id.get(trilha.get("system_id")) or {}
+            area = self.areas_por_id.get(sistema.get("area_id")) or {}
+            caminhos[ilha["id"]] = {
+                "ilha": ilha.get("titulo") or "Geral",
+                "trilha": trilha.get("nome") or "Geral",
+                "sistema": sistema.get("nome") or "Geral",
+                "area": area.get("nome") or "Geral",
+            }
+        return caminhos
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado_em = None
+
+    def garantir(self):
+        """Recarrega se o cache nunca foi carregado ou se o TTL venceu."""
+        if self._expirado():
+            # Só uma thread recarrega; as outras esperam e reaproveitam
+            with self._lock_carga:
+                if self._expirado():
+                    self.carregar()
+        return self
+
+    def _expirado(self):
+        return self._carregado_em is None or time.monotonic() - self._carregado_em > self.ttl
+
+    # --- Consultas usadas pelas rotas ---
+    def get_areas(self):
+        return self.garantir().areas
+
+    def get_sistemas(self, area_id):
+        return self.garantir().sistemas_por_area.get(area_id, [])
+
+    def get_trilhas(self, system_id):
+        return self.garantir().trilhas_por_sistema.get(system_id, [])
+
+    def get_ilhas(self, trilha_id):
+        return self.garantir().ilhas_por_trilha.get(trilha_id, [])
+
+    def caminho_ilha(self, ilha_id):
+        caminho = self.garantir().caminhos_por_ilha.get(ilha_id)
+        return caminho or {"ilha": "Geral", "trilha": "Geral", "sistema": "Geral", "area": "Geral"}
+
+
+curriculo = CacheCurriculo()
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from datetime import datetime, timezone
+from cachetools import LRUCache
+from database import get_supabase_async
+
+# ==============================================================================
+# 🗃️ CACHE DAS RESPOSTAS DA IA (memória + tabela llm_cache)
+# ==============================================================================
+# Os mesmos prompts chegam ao Gemini várias vezes (mesmo enunciado no
+# /praticar/semelhante). A chave é o SHA-256 do prompt normalizado, como no
+# rag_cache do frontend.
+#
+# A geração de questões da sessão/pool não passa por aqui: tudo o que ela gera
+# é gravado em questions, que já é o estoque da ilha.
+#
+# Duas camadas: LRU com TTL em memória e, atrás dela, a tabela llm_cache
+# (database/create_llm_cache.sql). Cada ponto de chamada tem sua política:
+#   - consumir=False: a entrada é uma resposta; um hit devolve os mesmos itens.
+#   - consumir=True: a entrada é um ESTOQUE de itens gerados e ainda não
+#     servidos. Um hit retira itens; o que a IA gerar além do pedido entra no
+#     estoque em vez de ser descartado. Estoque com ttl_banco > 0 fica só no
+#     banco (retirada atômica, compartilhada entre processos); com
+#     ttl_banco = 0, só na memória deste processo.
+#
+# Uso: itens = await cache_ia.itens(modelo, prompt, interpretar, quantidade, POLITICAS["semelhante"])
+# ==============================================================================
+
+MAX_ENTRADAS_MEMORIA = int(os.getenv("CACHE_IA_MAX_ENTRADAS", "2000"))
+INTERVALO_LIMPEZA = int(os.getenv("CACHE_IA_INTERVALO_LIMPEZA", "3600"))  # segundos
+
+
+class PoliticaCache:
+    def __init__(self, nome, ttl_memoria, ttl_banco, consumir):
+        self.nome = nome
+        self.ttl_memoria = ttl_memoria  # segundos (0 = não usa a memória)
+        self.ttl_banco = ttl_banco      # segundos (0 = não usa a llm_cache)
+        self.consumir = consumir
+
+
+def _politica(nome, ttl_memoria, ttl_banco, consumir):
+    """Política com TTLs ajustáveis no .env (ex.: CACHE_IA_SEMELHANTE_TTL_MEMORIA=0)."""
+    prefixo = f"CACHE_IA_{nome.upper()}"
+    return PoliticaCache(
+        nome,
+        int(os.getenv(f"{prefixo}_TTL_MEMORIA", str(ttl_memoria))),
+        int(os.getenv(f"{prefixo}_TTL_BANCO", str(ttl_banco))),
+        os.getenv(f"{prefixo}_CONSUMIR", "1" if consumir else "0") == "1",
+    )
+
+
+POLITICAS = {
+    # Variações de uma questão: estoque pequeno, local ao processo
+    "semelhante": _politica("semelhante", ttl_memoria=3600, ttl_banco=0, consumir=True),
+}
+
+
+def normalizar_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+
+def hash_prompt(prompt, modelo=None):
+    """SHA-256 do prompt normalizado (o nome do modelo entra na chave)."""
+    nome_modelo = getattr(modelo, "model_name", "") or ""
+    bruto = f"{nome_modelo}\n{normalizar_prompt(prompt)}"
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+class CacheIA:
+    def __init__(self, max_entradas=MAX_ENTRADAS_MEMORIA):
+        self._memoria = LRUCache(maxsize=max_entradas)  # hash -> [expira_em (monotonic), itens]
+        self._tarefa = None
+        self.metricas = {}
+
+    def _metricas(self, politica):
+        return self.metricas.setdefault(politica.nome, {
+            "hits_memoria": 0, "hits_banco": 0, "misses": 0,
+            "itens_guardados": 0, "erros_banco": 0,
+        })
+
+    # --- Ciclo de vida ---
+    async def iniciar(self):
+        self._tarefa = asyncio.create_task(self._loop_limpeza())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def _loop_limpeza(self):
+        while True:
+            await asyncio.sleep(INTERVALO_LIMPEZA)
+            agora = time.monotonic()
+            for chave in [c for c, (expira, _) in list(self._memoria.items()) if expira <= agora]:
+                self._memoria.pop(chave, None)
+            try:
+                db = await get_supabase_async()
+                resp = await db.rpc("cleanup_expired_llm_cache").execute()
+                if resp.data:
+                    print(f"🗃️ Cache da IA: {resp.data} entradas expiradas removidas.")
+            except Exception as e:
+                print(f"   ⚠️ Limpeza da llm_cache falhou: {e}")
+
+    # --- Consulta ---
+    async def itens(self, modelo, prompt, interpretar, quantidade, politica):
+        """
+        Até `quantidade` itens para o prompt: do cache quando houver, senão do
+        Gemini. `interpretar(texto)` converte a resposta em lista de dicts.
+        """
+        servidos = await self.retirar(modelo, prompt, quantidade, politica)
+        if servidos:
+            return servidos
+        resp = await modelo.generate_content_async(prompt)
+        gerados = interpretar(resp.text)
+        await self.guardar(modelo, prompt, gerados, quantidade, politica)
+        return gerados[:quantidade]
+
+    async def retirar(self, modelo, prompt, quantidade, politica):
+        """Só o cache (sem chamar o Gemini): itens para o prompt, ou [] num miss."""
+        chave = hash_prompt(prompt, modelo)
+        metricas = self._metricas(politica)
+
+        servidos = self._da_memoria(chave, quantidade, politica)
+        if servidos:
+            metricas["hits_memoria"] += 1
+            return servidos
+
+        if politica.ttl_banco:
+            servidos = await self._do_banco(chave, quantidade, politica)
+            if servidos:
+                metricas["hits_banco"] += 1
+                return servidos
+
+        metricas["misses"] += 1
+        return []
+
+    async def guardar(self, modelo, prompt, gerados, quantidade, politica):
+        """
+        Depois de um miss: guarda o que a IA gerou para o prompt. Em políticas
+        consumíveis, só o que passou de `quantidade` (o resto já foi servido).
+        """
+        chave = hash_prompt(prompt, modelo)
+        if not politica.consumir:
+            await self._guardar(chave, gerados, politica)
+            return
+        sobra = gerados[quantidade:]
+        if sobra:
+            await self._guardar(chave, sobra, politica)
+            self._metricas(politica)["itens_guardados"] += len(sobra)
+
+    def _da_memoria(self, chave, quantidade, politica):
+        if not politica.ttl_memoria or (politica.consumir and politica.ttl_banco):
+            return []
+        entrada = self._memoria.get(chave)
+        if not entrada:
+            return []
+        expira_em, itens = entrada
+        if expira_em <= time.monotonic():
+            self._memoria.pop(chave, None)
+            return []
+        if not politica.consumir:
+            return list(itens[:quantidade])
+        if len(itens) < quantidade:
+            return []
+        # Sem await entre a leitura e o corte: a retirada é atômica no event loop
+        servidos, entrada[1] = itens[:quantidade], itens[quantidade:]
+        if not entrada[1]:
+            self._memoria.pop(chave, None)
+        return servidos
+
+    async def _do_banco(self, chave, quantidade, politica):
+        try:
+            db = await get_supabase_async()
+            if politica.consumir:
+                resp = await db.rpc("consumir_llm_cache", {
+                    "p_query_hash": chave,
+                    "p_quantidade": quantidade,
+                }).execute()
+                return resp.data or []
+
+            resp = await db.table("llm_cache").select("itens")\
+                .eq("query_hash", chave)\
+                .gt("expires_at", datetime.now(timezone.utc).isoformat())\
+                .limit(1).execute()
+            if not resp.data:
+                return []
+            itens = resp.data[0]["itens"]
+            self._na_memoria(chave, itens, politica, acumular=False)
+            return itens[:quantidade]
+        except Exception as e:
+            self._metricas(politica)["erros_banco"] += 1
+            print(f"   ⚠️ llm_cache indisponível ({politica.nome}): {e}")
+            return []
+
+    async def _guardar(self, chave, itens, politica):
+        if not (politica.consumir and politica.ttl_banco):
+            self._na_memoria(chave, itens, politica, acumular=politica.consumir)
+        if not politica.ttl_banco:
+            return
+        try:
+            db = await get_supabase_async()
+            await db.rpc("guardar_itens_llm_cache", {
+                "p_query_hash": chave,
+                "p_call_site": politica.nome,
+                "p_itens": itens,
+                "p_ttl_segundos": politica.ttl_banco,
+                "p_acumular": politica.consumir,
+            }).execute()
+        except Exception as e:
+            self._metricas(politica)["erros_banco"] += 1
+            print(f"   ⚠️ Itens não gravados na llm_cache ({politica.nome}): {e}")
+
+    def _na_memoria(self, chave, itens, politica, acumular):
+        if not politica.ttl_memoria:
+            return
+        entrada = self._memoria.get(chave)
+        if acumular and entrada and entrada[0] > time.monotonic():
+            entrada[1] = entrada[1] + list(itens)
+            return
+        self._memoria[chave] = [time.monotonic() + politica.ttl_memoria, list(itens)]
+
+    def snapshot_metricas(self):
+        politicas = {}
+        for nome, m in self.metricas.items():
+            consultas = m["hits_memoria"] + m["hits_banco"] + m["misses"]
+            politicas[nome] = {
+                **m,
+                "hit_rate": round((m["hits_memoria"] + m["hits_banco"]) / consultas, 3) if consultas else 0.0,
+            }
+        return {"entradas_memoria": len(self._memoria), "politicas": politicas}
+
+
+cache_ia = CacheIA()
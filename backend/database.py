@@ -1,6 +1,8 @@
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient
 
 # Carrega as variáveis uma única vez
 load_dotenv()
@@ -11,7 +13,54 @@ key = os.environ.get("SUPABASE_KEY")
 if not url or not key:
     raise ValueError("❌ ERRO CRÍTICO: Variáveis SUPABASE_URL ou SUPABASE_KEY não encontradas no .env")
 
-# Cria a instância oficial do cliente
+# Cria a instância oficial do cliente (scripts e código síncrono)
 supabase: Client = create_client(url, key)
 
-print("🔌 Módulo de Banco de Dados carregado.")
\ No newline at end of file
+TAMANHO_PAGINA = 1000  # Limite padrão de linhas por request do PostgREST
+
+def buscar_tudo(tabela, colunas="*", ordem="id"):
+    """Lê a tabela inteira paginando (o Supabase corta em 1000 linhas)."""
+    linhas = []
+    inicio = 0
+    while True:
+        resp = supabase.table(tabela).select(colunas).order(ordem)\
+            .range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+        linhas.extend(resp.data)
+        if len(resp.data) < TAMANHO_PAGINA:
+            return linhas
+        inicio += TAMANHO_PAGINA
+
+# Cliente assíncrono para as rotas do FastAPI (criado na primeira chamada,
+# pois o acreate_client precisa de um event loop rodando)
+_supabase_async: AsyncClient | None = None
+_lock_async = asyncio.Lock()
+
+async def get_supabase_async() -> AsyncClient:
+    global _supabase_async
+    if _supabase_async is None:
+        async with _lock_async:
+            if _supabase_async is None:
+                _supabase_async = await acreate_client(url, key)
+    return _supabase_async
+
+# Executor limitado para o que ainda é bloqueante (helpers síncronos, SDKs sem async).
+# Assim uma chamada lenta nunca trava o event loop e nunca abre threads sem limite.
+MAX_THREADS_IO = int(os.getenv("MAX_THREADS_IO", "16"))
+_executor_io = ThreadPoolExecutor(max_workers=MAX_THREADS_IO, thread_name_prefix="io")
+
+async def rodar_em_thread(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor_io, lambda: func(*args, **kwargs))
+
+# Tarefas "dispare e esqueça" (telemetria, publicação no banco vetorial...).
+# O event loop só guarda referência fraca às tarefas: sem este conjunto, uma
+# tarefa em andamento pode ser coletada pelo GC no meio da execução.
+_tarefas_em_background = set()
+
+def em_background(coro):
+    tarefa = asyncio.create_task(coro)
+    _tarefas_em_background.add(tarefa)
+    tarefa.add_done_callback(_tarefas_em_background.discard)
+    return tarefa
+
+print("🔌 Módulo de Banco de Dados carregado.")
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import numpy as np
+from cachetools import LRUCache
+from database import get_supabase_async
+from embeddings import DIMENSOES_EMBEDDING, gerar_embeddings_lote
+from repositorio_questoes import separar_validas
+
+# ==============================================================================
+# 🧬 DEDUP NA INSERÇÃO (questões quase iguais geradas pela IA)
+# ==============================================================================
+# Antes de gravar, as questões novas são vetorizadas numa chamada em lote e
+# comparadas (cosseno, NumPy) com a matriz de embeddings da ilha em memória.
+# Acima de DEDUP_LIMIAR = clone: é descartada.
+#
+# A matriz de cada ilha é carregada na primeira vez que a ilha recebe questões
+# (questões antigas sem embedding são vetorizadas e gravadas em
+# question_embeddings) e só cresce com questões já gravadas. Entre o filtro e
+# o insert, as aceitas ficam num registro provisório (também comparado, para
+# pegar clones dentro do lote ou de outra geração em andamento), que é limpo
+# quando o insert termina, com sucesso ou não. Só as DEDUP_MAX_ILHAS mais
+# recentes ficam em memória.
+#
+# Uso: salvas = await inserir_sem_clones(questoes, funcao_de_insert)
+#   (ou filtrar -> insert -> registrar, com descartar num finally, quando a
+#   rota precisa das rejeitadas)
+# ==============================================================================
+
+LIMIAR = float(os.getenv("DEDUP_LIMIAR", "0.92"))
+MAX_ILHAS = int(os.getenv("DEDUP_MAX_ILHAS", "200"))
+PAGINA = 1000
+
+
+def _normalizar(vetores):
+    matriz = np.asarray(vetores, dtype=np.float32).reshape(-1, DIMENSOES_EMBEDDING)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+
+def _ler_vetor(linha):
+    # Recurso embutido pode vir como objeto (1-1) ou lista; o vector vem como texto '[0.1,...]'
+    emb = linha.get("question_embeddings")
+    if isinstance(emb, list):
+        emb = emb[0] if emb else None
+    bruto = emb.get("embedding") if emb else None
+    return json.loads(bruto) if isinstance(bruto, str) else bruto
+
+
+def _chave(q):
+    return (q.get("lesson_id"), (q.get("enunciado") or "").strip())
+
+
+class MatrizIlha:
+    def __init__(self, ids, matriz):
+        self.ids = list(ids)  # id da questão (só questões gravadas)
+        self.matriz = matriz  # (n, 768) normalizada
+
+    def mais_parecida(self, vetor):
+        """(id, similaridade) da questão mais parecida, ou (None, 0.0) se a ilha estiver vazia."""
+        if not self.ids:
+            return None, 0.0
+        sims = self.matriz @ vetor
+        i = int(np.argmax(sims))
+        return self.ids[i], float(sims[i])
+
+    def adicionar(self, id_questao, vetor):
+        self.ids.append(id_questao)
+        self.matriz = np.vstack([self.matriz, vetor[None, :]])
+
+
+class DeduplicadorQuestoes:
+    def __init__(self, limiar=LIMIAR, max_ilhas=MAX_ILHAS):
+        self.limiar = limiar
+        self._ilhas = LRUCache(maxsize=max_ilhas)
+        self._locks = {}
+        self._pendentes = {}  # chave (ilha, enunciado) -> vetor das aceitas cujo insert ainda não terminou
+        self.metricas = {"avaliadas": 0, "rejeitadas": 0}
+
+    async def _matriz(self, db, lesson_id):
+        if lesson_id in self._ilhas:
+            return self._ilhas[lesson_id]
+        lock = self._locks.setdefault(lesson_id, asyncio.Lock())
+        async with lock:
+            if lesson_id not in self._ilhas:
+                self._ilhas[lesson_id] = await self._carregar(db, lesson_id)
+            return self._ilhas[lesson_id]
+
+    async def _carregar(self, db, lesson_id):
+        linhas, inicio = [], 0
+        while True:
+            resp = await db.table("questions").select("id, enunciado, question_embeddings(embedding)")\
+                .eq("lesson_id", lesson_id).order("id")\
+                .range(inicio, inicio + PAGINA - 1).execute()
+            linhas.extend(resp.data)
+            if len(resp.data) < PAGINA:
+                break
+            inicio += PAGINA
+
+        vetores = [_ler_vetor(l) for l in linhas]
+
+        # Questões antigas sem embedding: vetoriza em lote e grava (uma vez só)
+        faltando = [i for i, v in enumerate(vetores) if not v]
+        if faltando:
+            novos = await gerar_embeddings_lote([linhas[i]["enunciado"] for i in faltando])
+            for i, vetor in zip(faltando, novos):
+                vetores[i] = vetor
+            await db.table("question_embeddings").upsert(
+                [{"question_id": linhas[i]["id"], "embedding": vetores[i]} for i in faltando]
+            ).execute()
+
+        ids = [l["id"] for l in linhas]
+        matriz = _normalizar(vetores) if linhas else np.empty((0, DIMENSOES_EMBEDDING), dtype=np.float32)
+        print(f"🧬 Matriz da ilha {lesson_id}: {len(ids)} questões ({len(faltando)} vetorizadas agora).")
+        return MatrizIlha(ids, matriz)
+
+    async def filtrar(self, questoes, db=None):
+        """
+        Separa as questões em (aceitas, rejeitadas).
+        rejeitadas = [(questao, id_da_parecida, similaridade)].
+        """
+        if not questoes:
+            return [], []
+        db = db or await get_supabase_async()
+        vetores = _normalizar(await gerar_embeddings_lote([q["enunciado"] for q in questoes]))
+
+        aceitas, rejeitadas = [], []
+        for q, vetor in zip(questoes, vetores):
+            self.metricas["avaliadas"] += 1
+            ilha = await self._matriz(db, q["lesson_id"])
+            id_parecida, similaridade = ilha.mais_parecida(vetor)
+            chave_pendente, sim_pendente = self._mais_parecida_pendente(q["lesson_id"], vetor)
+            if sim_pendente > similaridade:
+                id_parecida, similaridade = chave_pendente, sim_pendente
+            if similaridade >= self.limiar:
+                self.metricas["rejeitadas"] += 1
+                rejeitadas.append((q, id_parecida, similaridade))
+                continue
+            # Provisória: a próxima do mesmo lote (ou de outra geração) também é comparada com ela
+            self._pendentes[_chave(q)] = vetor
+            aceitas.append(q)
+
+        if rejeitadas:
+            print(f"   🧬 {len(rejeitadas)} questões quase iguais a outras da ilha foram descartadas.")
+        return aceitas, rejeitadas
+
+    def _mais_parecida_pendente(self, lesson_id, vetor):
+        """(chave, similaridade) da aceita ainda não gravada mais parecida na ilha."""
+        melhor, similaridade = None, 0.0
+        for chave, outro in self._pendentes.items():
+            if chave[0] != lesson_id:
+                continue
+            sim = float(outro @ vetor)
+            if sim > similaridade:
+                melhor, similaridade = chave, sim
+        return melhor, similaridade
+
+    async def registrar(self, salvas, db=None):
+        """Depois do insert: as gravadas entram na matriz da ilha (com id) e os embeddings vão para o banco."""
+        linhas = []
+        for q in salvas:
+            vetor = self._pendentes.pop(_chave(q), None)
+            if vetor is None:
+                continue
+            ilha = self._ilhas.get(q["lesson_id"])
+            if ilha:
+                ilha.adicionar(q["id"], vetor)
+            linhas.append({"question_id": q["id"], "embedding": vetor.tolist()})
+
+        if linhas:
+            db = db or await get_supabase_async()
+            await db.table("question_embeddings").upsert(linhas).execute()
+
+    def descartar(self, questoes):
+        """Limpa as provisórias que não foram gravadas (insert falhou ou não devolveu a linha)."""
+        for q in questoes:
+            self._pendentes.pop(_chave(q), None)
+
+
+deduplicador = DeduplicadorQuestoes()
+
+
+async def inserir_sem_clones(questoes, inserir, db=None):
+    """
+    filtrar -> inserir(aceitas) -> registrar. `inserir` é uma corrotina que grava
+    e devolve as linhas criadas. Se o dedup falhar (ex.: API de embeddings fora),
+    grava tudo como antes: o dedup nunca impede a geração.
+    """
+    validas, invalidas = separar_validas(questoes)
+    if invalidas:
+        print(f"   ⚠️ {len(invalidas)} questões inválidas descartadas antes do dedup.")
+    try:
+        aceitas, _ = await deduplicador.filtrar(validas, db)
+    except Exception as e:
+        print(f"   ⚠️ Dedup indisponível, gravando sem filtro: {e}")
+        return await inserir(validas)
+
+    try:
+        salvas = await inserir(aceitas)
+        try:
+            await deduplicador.registrar(salvas, db)
+        except Exception as e:
+            print(f"   ⚠️ Embeddings das questões novas não gravados: {e}")
+        return salvas
+    finally:
+        # Insert com erro (ou linhas que não voltaram): nada provisório fica para trás
+        deduplicador.descartar(aceitas)
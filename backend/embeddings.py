@@ -0,0 +1,40 @@
+import os
+import google.generativeai as genai
+
+# ==============================================================================
+# 🧭 EMBEDDINGS (mesmo modelo e dimensão do frontend / question_bank)
+# ==============================================================================
+# O question_bank guarda vector(768) gerado pelo frontend com gemini-embedding-001
+# (frontend/lib/ai-config.ts). Para comparar com ele, o backend PRECISA usar o
+# mesmo modelo e a mesma dimensão. Vetoriza-se só o enunciado, como lá.
+# ==============================================================================
+
+MODELO_EMBEDDING = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+DIMENSOES_EMBEDDING = 768
+
+
+async def gerar_embedding(texto):
+    """Vetor de 768 posições para o texto (uma chamada à API)."""
+    resp = await genai.embed_content_async(
+        model=f"models/{MODELO_EMBEDDING}",
+        content=texto,
+        output_dimensionality=DIMENSOES_EMBEDDING,
+    )
+    return resp["embedding"]
+
+
+
+TAMANHO_LOTE_EMBEDDING = 100  # Máximo de textos por chamada de batch da API
+
+
+async def gerar_embeddings_lote(textos):
+    """Vetores para vários textos, em chamadas de até TAMANHO_LOTE_EMBEDDING."""
+    vetores = []
+    for i in range(0, len(textos), TAMANHO_LOTE_EMBEDDING):
+        resp = await genai.embed_content_async(
+            model=f"models/{MODELO_EMBEDDING}",
+            content=textos[i:i + TAMANHO_LOTE_EMBEDDING],
+            output_dimensionality=DIMENSOES_EMBEDDING,
+        )
+        vetores.extend(resp["embedding"])
+    return vetores
@@ -0,0 +1,192 @@
+import asyncio
+import json
+from cache_curriculo import curriculo
+from database import em_background, rodar_em_thread
+from deduplicador import inserir_sem_clones
+from repositorio_questoes import inserir_questoes_em_lote_async
+
+# ==============================================================================
+# 🤖 GERAÇÃO DE QUESTÕES PELA IA (compartilhado entre a rota de sessão e o pool)
+# ==============================================================================
+
+DESCRICAO_NIVEL = {
+    "Fácil": "(Conceitos básicos, definições, anatomia)",
+    "Médio": "(Fisiopatologia, diagnóstico, casos clínicos simples)",
+    "Difícil": "(Conduta, complicações, casos complexos, detalhes técnicos)",
+}
+
+
+def tema_da_ilha(ilha_id):
+    """Título da ilha direto do cache do currículo (sem ida ao banco)."""
+    ilha = curriculo.ilhas_por_id.get(ilha_id)
+    return ilha['titulo'] if ilha else "Medicina"
+
+
+def montar_prompt_sessao(tema, quantidade, dificuldade):
+    return f"""
+        Você é um preceptor médico. Crie {quantidade} questões de múltipla escolha INÉDITAS sobre: '{tema}'.
+
+        NÍVEL DE DIFICULDADE: {dificuldade.upper()}
+        {DESCRICAO_NIVEL.get(dificuldade, DESCRICAO_NIVEL["Difícil"])}
+
+        IMPORTANTE: Varie os subtemas para não repetir assuntos anteriores.
+
+        Retorne APENAS JSON válido:
+        [
+            {{
+                "enunciado": "...",
+                "alternativa_a": "...",
+                "alternativa_b": "...",
+                "alternativa_c": "...",
+                "alternativa_d": "...",
+                "correta": "A",
+                "explicacao": "...",
+                "dificuldade": "{dificuldade}"
+            }}
+        ]
+        """
+
+
+def interpretar_resposta(texto, ilha_id, dificuldade):
+    """Converte o texto do Gemini em dicts prontos para a tabela questions."""
+    texto_json = texto.replace("```json", "").replace("```", "").strip()
+    novas_questoes = json.loads(texto_json)
+    if isinstance(novas_questoes, dict): novas_questoes = [novas_questoes]
+
+    for q in novas_questoes:
+        etiquetar(q, ilha_id, dificuldade)
+    return novas_questoes
+
+
+def etiquetar(questao, ilha_id, dificuldade):
+    questao['lesson_id'] = ilha_id
+    questao['dificuldade'] = dificuldade # Força a etiqueta certa
+    return questao
+
+
+class ParserArrayJSON:
+    """
+    Parser incremental do array que o Gemini devolve em stream: recebe o texto
+    em pedaços e devolve cada objeto de primeiro nível assim que ele fecha.
+    Fora dos objetos, tudo é ignorado ('[', vírgulas, cercas ```json).
+    """
+
+    def __init__(self):
+        self._objeto = []
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+
+    def alimentar(self, pedaco):
+        prontos = []
+        for c in pedaco:
+            if self._profundidade == 0:
+                if c == '{':
+                    self._objeto = [c]
+                    self._profundidade = 1
+                continue
+
+            self._objeto.append(c)
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+            elif c == '"':
+                self._em_string = True
+            elif c == '{':
+                self._profundidade += 1
+            elif c == '}':
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    try:
+                        prontos.append(json.loads(''.join(self._objeto)))
+                    except json.JSONDecodeError as e:
+                        print(f"   ⚠️ Objeto inválido no stream da IA descartado: {e}")
+        return prontos
+
+
+async def gerar_questoes_ia(modelo, ilha_id, quantidade, dificuldade):
+    """
+    Pede `quantidade` questões ao Gemini para a ilha (não salva nada).
+    Sem cache da IA: tudo o que é gerado vai para o banco, e o estoque da ilha
+    em questions já atende os próximos pedidos iguais.
+    """
+    if not curriculo.ilhas_por_id:
+        await rodar_em_thread(curriculo.garantir)
+    prompt = montar_prompt_sessao(tema_da_ilha(ilha_id), quantidade, dificuldade)
+    ai_resp = await modelo.generate_content_async(prompt)
+    return interpretar_resposta(ai_resp.text, ilha_id, dificuldade)
+
+
+async def gerar_questoes_ia_stream(modelo, ilha_id, quantidade, dificuldade):
+    """
+    Como gerar_questoes_ia, mas entrega cada questão assim que o objeto dela
+    fecha no stream do Gemini.
+    """
+    if not curriculo.ilhas_por_id:
+        await rodar_em_thread(curriculo.garantir)
+    prompt = montar_prompt_sessao(tema_da_ilha(ilha_id), quantidade, dificuldade)
+
+    parser = ParserArrayJSON()
+    resposta = await modelo.generate_content_async(prompt, stream=True)
+    async for pedaco in resposta:
+        for q in parser.alimentar(pedaco.text):
+            yield etiquetar(q, ilha_id, dificuldade)
+
+
+_FIM_DO_STREAM = object()
+
+
+async def gerar_e_salvar_em_stream(modelo, db, ilha_id, quantidade, dificuldade):
+    """
+    Entrega as questões geradas em stream já gravadas (com id). Cada uma é
+    gravada numa tarefa própria enquanto o stream da IA continua; elas saem na
+    ordem em que o insert termina. Se o cliente desconectar, a geração e as
+    gravações seguem até o fim (o que sobrar vira estoque da ilha).
+    """
+    fila = asyncio.Queue()
+
+    async def gravar(q):
+        try:
+            for salva in await salvar_questoes(db, [q]):
+                fila.put_nowait(salva)
+        except Exception as e:
+            print(f"   ⚠️ Questão gerada em stream não foi gravada: {e}")
+
+    async def produzir():
+        gravacoes = []
+        try:
+            async for q in gerar_questoes_ia_stream(modelo, ilha_id, quantidade, dificuldade):
+                gravacoes.append(asyncio.create_task(gravar(q)))
+        except Exception as e:
+            fila.put_nowait(e)
+        finally:
+            await asyncio.gather(*gravacoes)
+            fila.put_nowait(_FIM_DO_STREAM)
+
+    produtor = em_background(produzir())  # Referência forte: segue mesmo se o cliente sair
+    erro = None
+    while True:
+        item = await fila.get()
+        if item is _FIM_DO_STREAM:
+            break
+        if isinstance(item, Exception):
+            erro = item  # Entrega primeiro o que já foi gravado
+            continue
+        yield item
+    await produtor
+    if erro:
+        raise erro
+
+
+async def salvar_questoes(db, questoes):
+    """
+    Descarta clones de questões que a ilha já tem (deduplicador.py), insere o resto
+    em um único request e devolve as linhas criadas (com id).
+    """
+    async def inserir(aceitas):
+        return await inserir_questoes_em_lote_async(db, aceitas)
+    return await inserir_sem_clones(questoes, inserir, db)
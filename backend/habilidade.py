@@ -0,0 +1,42 @@
+import math
+import os
+
+# ==============================================================================
+# 📈 HABILIDADE POR (ALUNO, ILHA) — modo de dificuldade adaptativo
+# ==============================================================================
+# Estimativa tipo Elo / Rasch (1PL): cada ilha tem uma habilidade θ do aluno e
+# cada nível de dificuldade uma "dificuldade" b fixa. A chance de acerto é
+# logística(θ - b) e cada tentativa ajusta θ em O(1):
+#       θ += K * (resultado - P(acerto))
+# K começa alto e cai com o número de tentativas (estimativa estabiliza).
+#
+# A fonte da verdade é user_lesson_ability, atualizada por um trigger em
+# user_history (database/create_user_lesson_ability.sql): cada tentativa
+# gravada, por qualquer caminho e qualquer worker do uvicorn, aplica o passo
+# acima numa única UPDATE. O θ do aluno chega junto com as candidatas da
+# sessão (get_candidatas_sessao): o modo adaptativo não faz leitura extra.
+# ==============================================================================
+
+DIFICULDADE_ITEM = {"Fácil": -1.0, "Médio": 0.0, "Difícil": 1.0}  # Mesmos valores do trigger
+ALVO_ACERTO = float(os.getenv("HABILIDADE_ALVO_ACERTO", "0.7"))  # Sessões "na medida": ~70% de acerto
+DISPERSAO_MIX = float(os.getenv("HABILIDADE_DISPERSAO_MIX", "0.7"))  # Quanto a sessão mistura níveis vizinhos
+
+
+def plano_sessao(theta, quantidade):
+    """
+    Quantas questões de cada nível para a próxima sessão, ordenado do nível
+    mais adequado para o menos adequado. O nível ideal é o de chance de
+    acerto ≈ ALVO_ACERTO; os vizinhos entram com peso gaussiano.
+    """
+    b_ideal = theta - math.log(ALVO_ACERTO / (1 - ALVO_ACERTO))
+    pesos = {d: math.exp(-((b - b_ideal) ** 2) / (2 * DISPERSAO_MIX ** 2)) for d, b in DIFICULDADE_ITEM.items()}
+    total = sum(pesos.values())
+
+    # Maiores restos: a soma bate exatamente com `quantidade`
+    exatos = {d: quantidade * p / total for d, p in pesos.items()}
+    plano = {d: int(x) for d, x in exatos.items()}
+    for d in sorted(exatos, key=lambda d: exatos[d] - plano[d], reverse=True)[:quantidade - sum(plano.values())]:
+        plano[d] += 1
+
+    ordem = sorted(pesos, key=pesos.get, reverse=True)
+    return {d: plano[d] for d in ordem}
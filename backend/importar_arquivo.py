@@ -0,0 +1,187 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from itertools import islice
+from database import TAMANHO_PAGINA, supabase
+from inserir_manual import IndiceLicoes, normalizar_titulo
+from repositorio_questoes import inserir_questoes_em_lote, preparar_questao, validar_questao
+
+# ==============================================================================
+# 📥 IMPORTAÇÃO DE QUESTÕES POR ARQUIVO (JSONL ou CSV)
+# ==============================================================================
+# O arquivo é processado em streaming, linha a linha, por uma cadeia de geradores:
+#   ler → validar esquema → resolver ilha → deduplicar → gravar em lotes
+# A memória fica constante mesmo para dumps de milhares de questões.
+# Linhas recusadas vão para <arquivo>.rejeitadas.jsonl com o motivo.
+#
+# Uso:
+#   python importar_arquivo.py provas_2025.jsonl
+#   python importar_arquivo.py provas_2025.csv --lote 200
+#
+# Colunas: ilha_alvo (ou lesson_id), enunciado, alternativa_a..d, correta,
+#          explicacao, dificuldade
+# ==============================================================================
+
+TAMANHO_LOTE = 100
+PROGRESSO_A_CADA = 500
+
+
+class Rejeitos:
+    """Arquivo de linhas recusadas (aberto só se houver recusa)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.total = 0
+        self._arquivo = None
+
+    def registrar(self, linha, motivo, registro):
+        if self._arquivo is None:
+            self._arquivo = open(self.caminho, "w", encoding="utf-8")
+        self._arquivo.write(json.dumps({"linha": linha, "motivo": motivo, "registro": registro}, ensure_ascii=False) + "\n")
+        self.total += 1
+
+    def fechar(self):
+        if self._arquivo:
+            self._arquivo.close()
+
+
+# --- Estágios do pipeline (cada um recebe e devolve um iterador de (linha, questão)) ---
+
+def ler_registros(caminho, rejeitos):
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        if caminho.lower().endswith(".csv"):
+            for n, registro in enumerate(csv.DictReader(f), 2):  # linha 1 = cabeçalho
+                yield n, registro
+        else:
+            for n, texto in enumerate(f, 1):
+                if not texto.strip():
+                    continue
+                try:
+                    registro = json.loads(texto)
+                except json.JSONDecodeError as e:
+                    rejeitos.registrar(n, f"JSON inválido: {e}", texto.strip())
+                    continue
+                if not isinstance(registro, dict):
+                    rejeitos.registrar(n, "Cada linha deve ser um objeto JSON", registro)
+                    continue
+                yield n, registro
+
+
+def validar_esquema(registros, rejeitos):
+    for n, registro in registros:
+        questao = preparar_questao(registro)
+        erros = validar_questao(questao, exigir_licao=False)
+        if erros:
+            rejeitos.registrar(n, "; ".join(erros), registro)
+            continue
+        yield n, {**questao, "ilha_alvo": registro.get("ilha_alvo"), "lesson_id": registro.get("lesson_id")}
+
+
+def resolver_ilha(questoes, indice, rejeitos):
+    for n, q in questoes:
+        ilha_alvo = q.pop("ilha_alvo", None)
+        if q.get("lesson_id"):
+            try:
+                q["lesson_id"] = int(q["lesson_id"])
+            except (TypeError, ValueError):
+                q["lesson_id"] = None
+            if q["lesson_id"] not in indice.ids:
+                rejeitos.registrar(n, f"lesson_id inexistente: {q['lesson_id']}", q)
+                continue
+        else:
+            q["lesson_id"] = indice.resolver(ilha_alvo)
+            if q["lesson_id"] is None:
+                dica = indice.sugestoes(ilha_alvo or "")
+                motivo = f"Ilha não encontrada: '{ilha_alvo}'"
+                if dica:
+                    motivo += " | Você quis dizer: " + " / ".join(f"'{d}'" for d in dica) + "?"
+                rejeitos.registrar(n, motivo, q)
+                continue
+        yield n, q
+
+
+def _hash_enunciado(texto):
+    return hashlib.sha1(normalizar_titulo(texto).encode("utf-8")).digest()
+
+
+def _enunciados_da_ilha(ilha_id):
+    """Hashes de todos os enunciados da ilha (paginando: o PostgREST corta em 1000 linhas)."""
+    hashes, inicio = set(), 0
+    while True:
+        resp = supabase.table("questions").select("enunciado").eq("lesson_id", ilha_id).order("id")\
+            .range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+        hashes.update(_hash_enunciado(e["enunciado"]) for e in resp.data)
+        if len(resp.data) < TAMANHO_PAGINA:
+            return hashes
+        inicio += TAMANHO_PAGINA
+
+
+def deduplicar(questoes, rejeitos):
+    """
+    Descarta enunciados que já existem na ilha (ou que se repetem no arquivo).
+    Os enunciados de cada ilha são lidos uma única vez, na primeira vez que ela aparece,
+    e guardados só como hash.
+    """
+    vistos_por_ilha = {}
+    for n, q in questoes:
+        ilha_id = q["lesson_id"]
+        if ilha_id not in vistos_por_ilha:
+            vistos_por_ilha[ilha_id] = _enunciados_da_ilha(ilha_id)
+
+        assinatura = _hash_enunciado(q["enunciado"])
+        if assinatura in vistos_por_ilha[ilha_id]:
+            rejeitos.registrar(n, "Enunciado duplicado", q)
+            continue
+        vistos_por_ilha[ilha_id].add(assinatura)
+        yield n, q
+
+
+def em_lotes(itens, tamanho):
+    itens = iter(itens)
+    while lote := list(islice(itens, tamanho)):
+        yield lote
+
+
+def importar(caminho, tamanho_lote=TAMANHO_LOTE):
+    print(f"📥 Importando '{caminho}'...")
+    rejeitos = Rejeitos(os.path.splitext(caminho)[0] + ".rejeitadas.jsonl")
+    indice = IndiceLicoes.carregar()
+
+    pipeline = ler_registros(caminho, rejeitos)
+    pipeline = validar_esquema(pipeline, rejeitos)
+    pipeline = resolver_ilha(pipeline, indice, rejeitos)
+    pipeline = deduplicar(pipeline, rejeitos)
+
+    salvas = 0
+    ultima_linha = 0
+    proximo_aviso = PROGRESSO_A_CADA
+    try:
+        for lote in em_lotes(pipeline, tamanho_lote):
+            ultima_linha = lote[-1][0]
+            questoes = [q for _, q in lote]
+            try:
+                salvas += len(inserir_questoes_em_lote(questoes))
+            except Exception as e:
+                for n, q in lote:
+                    rejeitos.registrar(n, f"Erro ao gravar o lote: {e}", q)
+            if ultima_linha >= proximo_aviso:
+                print(f"   ⏳ Linha {ultima_linha} | {salvas} salvas | {rejeitos.total} rejeitadas")
+                proximo_aviso = ultima_linha + PROGRESSO_A_CADA
+    finally:
+        rejeitos.fechar()
+
+    print("\n📊 RESUMO FINAL:")
+    print(f"   Salvas: {salvas}")
+    print(f"   Rejeitadas: {rejeitos.total}")
+    if rejeitos.total:
+        print(f"   Veja os motivos em: {rejeitos.caminho}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa questões de um arquivo JSONL ou CSV.")
+    parser.add_argument("arquivo")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="Questões por insert")
+    args = parser.parse_args()
+    importar(args.arquivo, args.lote)
@@ -1,51 +1,93 @@
 import asyncio
-from database import supabase
-from questoes_novas import QUESTOES_PARA_INSERIR # Importa sua lista
+import difflib
+import re
+import unicodedata
+from database import buscar_tudo
+from repositorio_questoes import inserir_questoes_em_lote, preparar_questao, validar_questao
+
+
+def normalizar_titulo(texto):
+    """'  Átrio   Direito ' -> 'atrio direito' (ignora acentos, caixa e espaços)."""
+    sem_acento = unicodedata.normalize("NFKD", texto or "")
+    sem_acento = "".join(c for c in sem_acento if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", sem_acento).strip().casefold()
+
+
+class IndiceLicoes:
+    """Índice título → id de todas as ilhas, montado com UMA consulta."""
+
+    def __init__(self, licoes):
+        self.por_titulo = {}
+        self.originais = {}
+        self.ids = {licao['id'] for licao in licoes}
+        for licao in licoes:
+            chave = normalizar_titulo(licao['titulo'])
+            # Se o mesmo título existir em duas trilhas, vale o primeiro (como antes)
+            self.por_titulo.setdefault(chave, licao['id'])
+            self.originais.setdefault(chave, licao['titulo'])
+
+    @classmethod
+    def carregar(cls):
+        return cls(buscar_tudo("lessons", "id, titulo"))
+
+    def resolver(self, titulo):
+        return self.por_titulo.get(normalizar_titulo(titulo))
+
+    def sugestoes(self, titulo, n=3):
+        parecidas = difflib.get_close_matches(normalizar_titulo(titulo), self.por_titulo.keys(), n=n, cutoff=0.6)
+        return [self.originais[p] for p in parecidas]
+
 
 async def importar_questoes():
+    from questoes_novas import QUESTOES_PARA_INSERIR # Importa sua lista (só aqui: o índice é reusado pelo importar_arquivo.py)
+
     print("📦 Iniciando importação manual de questões...")
-    sucesso = 0
-    erros = 0
-
-    for q in QUESTOES_PARA_INSERIR:
-        nome_ilha = q["ilha_alvo"]
-        
-        # 1. Achar o ID da Ilha pelo nome (O "Pulo do Gato")
-        print(f"🔎 Procurando ilha: '{nome_ilha}'...")
-        res = supabase.table("lessons").select("id").eq("titulo", nome_ilha).execute()
-
-        if not res.data:
-            print(f"   ❌ ERRO: Ilha não encontrada! Verifique se digitou o nome EXATAMENTE igual.")
-            erros += 1
-            continue # Pula para a próxima questão
-        
-        ilha_id = res.data[0]['id']
-
-        # 2. Preparar o pacote para envio
-        nova_questao = {
-            "lesson_id": ilha_id,
-            "enunciado": q["enunciado"],
-            "alternativa_a": q["alternativa_a"],
-            "alternativa_b": q["alternativa_b"],
-            "alternativa_c": q["alternativa_c"],
-            "alternativa_d": q["alternativa_d"],
-            "correta": q["correta"].upper(), # Garante que seja 'A' e não 'a'
-            "explicacao": q["explicacao"],
-            "dificuldade": q["dificuldade"]
-        }
-
-        # 3. Inserir no Banco
-        try:
-            supabase.table("questions").insert(nova_questao).execute()
-            print(f"   ✅ Questão salva com sucesso na ilha {ilha_id}!")
-            sucesso += 1
-        except Exception as e:
-            print(f"   ❌ Erro ao salvar no banco: {e}")
-            erros += 1
+
+    # 1. Achar o ID das Ilhas pelo nome (O "Pulo do Gato"): um índice, uma consulta
+    indice = IndiceLicoes.carregar()
+    print(f"🔎 Índice montado com {len(indice.por_titulo)} ilhas.")
+
+    # 2. Validar o arquivo INTEIRO antes de gravar qualquer coisa
+    pacote = []
+    problemas = []
+    for n, q in enumerate(QUESTOES_PARA_INSERIR, 1):
+        nome_ilha = q.get("ilha_alvo", "")
+        ilha_id = indice.resolver(nome_ilha)
+
+        if ilha_id is None:
+            dica = indice.sugestoes(nome_ilha)
+            msg = f"Ilha não encontrada: '{nome_ilha}'"
+            if dica:
+                msg += " | Você quis dizer: " + " / ".join(f"'{d}'" for d in dica) + "?"
+            problemas.append((n, [msg]))
+            continue
+
+        nova_questao = preparar_questao({**q, "lesson_id": ilha_id})
+        erros = validar_questao(nova_questao)
+        if erros:
+            problemas.append((n, erros))
+            continue
+
+        pacote.append(nova_questao)
+
+    if problemas:
+        print(f"\n❌ {len(problemas)} questões com problema. Nada foi gravado:")
+        for n, erros in problemas:
+            for erro in erros:
+                print(f"   #{n}: {erro}")
+        return
+
+    # 3. Inserir no Banco (tudo em lote)
+    try:
+        salvas = inserir_questoes_em_lote(pacote)
+        print(f"   ✅ {len(salvas)} questões salvas em lote!")
+    except Exception as e:
+        print(f"   ❌ Erro ao salvar no banco: {e}")
+        salvas = []
 
     print(f"\n📊 RESUMO FINAL:")
-    print(f"   Salvas: {sucesso}")
-    print(f"   Falhas: {erros}")
+    print(f"   Salvas: {len(salvas)}")
+    print(f"   Falhas: {len(pacote) - len(salvas)}")
 
 if __name__ == "__main__":
-    asyncio.run(importar_questoes())
\ No newline at end of file
+    asyncio.run(importar_questoes())
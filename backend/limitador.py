@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+# ==============================================================================
+# 🚦 LIMITADOR DE TAXA (Token Bucket)
+# ==============================================================================
+# Um balde com `capacidade` fichas que se reabastece a `por_minuto` fichas/min.
+# Cada chamada ao Gemini consome uma ficha; sem ficha, a corrotina espera.
+# ==============================================================================
+
+
+class LimitadorTaxa:
+    def __init__(self, por_minuto, capacidade=None):
+        self.taxa = por_minuto / 60.0  # fichas por segundo
+        self.capacidade = capacidade or max(1, int(por_minuto))
+        self._fichas = float(self.capacidade)
+        self._atualizado_em = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado_em) * self.taxa)
+        self._atualizado_em = agora
+
+    async def adquirir(self, fichas=1):
+        # O lock garante a ordem de chegada: ninguém "fura a fila" do balde
+        async with self._lock:
+            while True:
+                self._reabastecer()
+                if self._fichas >= fichas:
+                    self._fichas -= fichas
+                    return
+                await asyncio.sleep((fichas - self._fichas) / self.taxa)
@@ -1,10 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from database import supabase
+from database import em_background, get_supabase_async, rodar_em_thread
+from cache_curriculo import curriculo
+from gerador_questoes import gerar_questoes_ia, gerar_e_salvar_em_stream, salvar_questoes, tema_da_ilha
+from repositorio_questoes import DIFICULDADE_BANCO, de_question_bank, para_question_bank
+from embeddings import gerar_embedding
+from deduplicador import deduplicador
+from pool_questoes import ReabastecedorQuestoes
+from singleflight import SingleFlight
+from buffer_historico import BufferHistorico
+from motor_selecao import CandidatasIlha
+from habilidade import plano_sessao
+from cache_ia import POLITICAS, cache_ia
+from worker_embeddings import WorkerEmbeddings
 from datetime import datetime, timedelta, timezone
 import os
+import hashlib
+import time
 import json 
 import google.generativeai as genai 
 import random
@@ -27,7 +44,52 @@ ai_model = genai.GenerativeModel(
     generation_config={"response_mime_type": "application/json"} # Força resposta JSON pura
 )
 
-app = FastAPI()
+# 3. POOL DE PRÉ-GERAÇÃO (desligue com POOL_ATIVO=0)
+reabastecedor = ReabastecedorQuestoes(ai_model) if os.getenv("POOL_ATIVO", "1") == "1" else None
+
+# 4. WRITE-BEHIND DO HISTÓRICO (opcional: HISTORICO_WRITE_BEHIND=1)
+buffer_historico = BufferHistorico() if os.getenv("HISTORICO_WRITE_BEHIND", "0") == "1" else None
+
+# 5. WORKER DE EMBEDDINGS DO question_bank (opcional: EMBEDDINGS_WORKER_ATIVO=1)
+worker_embeddings = WorkerEmbeddings() if os.getenv("EMBEDDINGS_WORKER_ATIVO", "0") == "1" else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carrega a árvore do currículo uma vez ao ligar o servidor
+    try:
+        await rodar_em_thread(curriculo.carregar)
+    except Exception as e:
+        print(f"⚠️ Não foi possível pré-carregar o currículo: {e}")
+    if reabastecedor:
+        await reabastecedor.iniciar()
+    if buffer_historico:
+        await buffer_historico.iniciar()
+    await cache_ia.iniciar()
+    if worker_embeddings:
+        await worker_embeddings.iniciar()
+    yield
+    if reabastecedor:
+        await reabastecedor.parar()
+    if buffer_historico:
+        # Flush-on-shutdown: nada do que foi confirmado ao aluno fica para trás
+        await buffer_historico.parar()
+    await cache_ia.parar()
+    if worker_embeddings:
+        await worker_embeddings.parar()
+
+app = FastAPI(lifespan=lifespan)
+
+# Gerações da IA em andamento, compartilhadas entre requests iguais
+geracoes_em_voo = SingleFlight()
+TAMANHO_BALDE_GERACAO = 5  # Arredonda o pedido para múltiplos de 5 (mais requests caem na mesma chave)
+MODOS_ADAPTATIVOS = {"adaptativo", "adaptive"}
+
+# /praticar/semelhante: vizinhos no question_bank (similaridade de cosseno)
+SEMELHANTE_LIMIAR = float(os.getenv("SEMELHANTE_LIMIAR", "0.80"))            # mínimo para contar como "mesmo conceito"
+SEMELHANTE_DISTANCIA_MIN = float(os.getenv("SEMELHANTE_DISTANCIA_MIN", "0.03"))  # abaixo disso é a mesma questão
+SEMELHANTE_CANDIDATOS = 10
+SEMELHANTE_TENTATIVAS = 2  # Variação clone: tenta mais uma antes de servir uma existente
+SEMELHANTE_VARIANTES = int(os.getenv("SEMELHANTE_VARIANTES", "3"))  # Variações por chamada à IA; as extras ficam no cache
 
 # Configuração do CORS
 app.add_middleware(
@@ -36,8 +98,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Proximo-Cursor"],
 )
 
+# Compressão das respostas grandes (mapa, erros). Brotli se o pacote estiver instalado.
+try:
+    from brotli_asgi import BrotliMiddleware  # pip install brotli-asgi (opcional)
+    app.add_middleware(BrotliMiddleware, minimum_size=1000, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # --- MODELOS DE DADOS ---
 class Tentativa(BaseModel):
     user_id: str
@@ -47,26 +117,100 @@ class Tentativa(BaseModel):
 # ==========================================
 # 1. ROTAS DE NAVEGAÇÃO (HIERARQUIA)
 # ==========================================
+# Rotas síncronas (def) de propósito: respondem da memória e, quando o TTL
+# vence, o FastAPI já as executa no threadpool, fora do event loop.
+
+def responder_com_etag(request: Request, dados, versao: str):
+    """
+    Responde com ETag. Se o cliente mandar If-None-Match igual, devolve 304 sem corpo.
+    """
+    etag = f'"{versao}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=dados, headers=headers)
 
 @app.get("/areas")
-def get_areas():
-    response = supabase.table("areas").select("*").execute()
-    return response.data
+def get_areas(request: Request):
+    dados = curriculo.get_areas()
+    return responder_com_etag(request, dados, curriculo.versao)
 
 @app.get("/sistemas/{area_id}")
-def get_sistemas(area_id: int):
-    response = supabase.table("systems").select("*").eq("area_id", area_id).execute()
-    return response.data
+def get_sistemas(area_id: int, request: Request):
+    dados = curriculo.get_sistemas(area_id)
+    return responder_com_etag(request, dados, curriculo.versao)
 
 @app.get("/trilhas/{system_id}")
-def get_trilhas_por_sistema(system_id: int):
-    response = supabase.table("modules").select("*").eq("system_id", system_id).order("ordem").execute()
-    return response.data
+def get_trilhas_por_sistema(system_id: int, request: Request):
+    dados = curriculo.get_trilhas(system_id)
+    return responder_com_etag(request, dados, curriculo.versao)
 
 @app.get("/ilhas/{trilha_id}")
-def get_ilhas(trilha_id: int):
-    response = supabase.table("lessons").select("*").eq("module_id", trilha_id).order("posicao_x").execute()
-    return response.data
+def get_ilhas(trilha_id: int, request: Request):
+    dados = curriculo.get_ilhas(trilha_id)
+    return responder_com_etag(request, dados, curriculo.versao)
+
+@app.get("/mapa/{system_id}")
+async def get_mapa_sistema(system_id: int, user_id: str, request: Request):
+    """
+    Tudo o que a tela do mapa precisa em UMA chamada: as trilhas do sistema,
+    as ilhas de cada trilha (ordenadas por posicao_x) e o nivel_atual do aluno
+    em cada ilha. Árvore do cache + uma consulta de progresso.
+    ETag = versão do currículo + hash do progresso (304 se nada mudou).
+    """
+    await rodar_em_thread(curriculo.garantir)
+    sistema = curriculo.sistemas_por_id.get(system_id)
+    if not sistema:
+        raise HTTPException(status_code=404, detail="Sistema não encontrado")
+
+    trilhas = curriculo.get_trilhas(system_id)
+    ids_ilhas = [i["id"] for t in trilhas for i in curriculo.get_ilhas(t["id"])]
+
+    niveis = {}
+    if ids_ilhas:
+        db = await get_supabase_async()
+        resp = await db.table("user_progress")\
+            .select("lesson_id, nivel_atual")\
+            .eq("user_id", user_id)\
+            .in_("lesson_id", ids_ilhas)\
+            .execute()
+        niveis = {p["lesson_id"]: p["nivel_atual"] for p in resp.data}
+
+    dados = {
+        "sistema": {"id": sistema["id"], "nome": sistema.get("nome")},
+        "trilhas": [
+            {
+                **{k: v for k, v in trilha.items() if k != "system_id"},
+                "ilhas": [
+                    {**{k: v for k, v in ilha.items() if k != "module_id"}, "nivel": niveis.get(ilha["id"], 0)}
+                    for ilha in curriculo.get_ilhas(trilha["id"])
+                ],
+            }
+            for trilha in trilhas
+        ],
+    }
+
+    progresso = json.dumps(sorted(niveis.items())).encode("utf-8")
+    versao = f"{curriculo.versao}-{hashlib.sha256(progresso).hexdigest()[:12]}"
+    return responder_com_etag(request, dados, versao)
+
+@app.post("/cache/curriculo/invalidar")
+def invalidar_cache_curriculo(request: Request):
+    """
+    Força a releitura do currículo (usar depois de rodar o setup_inicial.py).
+    Exige o header X-Admin-Token igual ao CACHE_ADMIN_TOKEN do .env; sem o
+    token configurado a rota fica desligada.
+    """
+    token = os.getenv("CACHE_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="CACHE_ADMIN_TOKEN não configurado")
+    if request.headers.get("x-admin-token") != token:
+        raise HTTPException(status_code=403, detail="Token inválido")
+
+    curriculo.invalidar()
+    curriculo.garantir()
+    return {"status": "recarregado", "versao": curriculo.versao}
 
 # ==========================================
 # 2. ROTAS DE PRÁTICA (QUIZ) - OTIMIZADAS
@@ -78,157 +222,415 @@ def get_ilhas(trilha_id: int):
 async def get_sessao_treino(ilha_id: int, user_id: str, dificuldade: str = "Fácil", quantidade: int = 5):
     """
     Gera uma sessão com 3 garantias:
-    1. Dificuldade correta.
-    2. Apenas questões INÉDITAS (não respondidas pelo usuário).
-    3. Se faltar, a IA gera na hora.
+    1. Dificuldade correta. Com dificuldade=adaptativo, o mix de níveis sai da
+       habilidade estimada do aluno na ilha (habilidade.py; o θ vem com as candidatas).
+    2. Questões escolhidas pelo motor de seleção: inéditas primeiro, revisões de
+       erros espaçadas no tempo e bônus para questões informativas (motor_selecao.py).
+    3. Se faltar elegível, a IA gera na hora (raro: o pool em background mantém o estoque).
     """
-    print(f"🎲 Sessão Ilha {ilha_id} | User {user_id} | Nível: {dificuldade}")
-    
-    # 1. Descobre quais questões o usuário JÁ respondeu (para não repetir)
-    hist = supabase.table("user_history").select("question_id").eq("user_id", user_id).execute()
-    ids_respondidos = {h['question_id'] for h in hist.data} 
-    
-    # 2. Busca TODAS as questões dessa ilha COM A DIFICULDADE CERTA
-    response = supabase.table("questions")\
-        .select("*")\
-        .eq("lesson_id", ilha_id)\
-        .eq("dificuldade", dificuldade)\
-        .execute()
-    
-    todas_questoes_nivel = response.data
-    
-    # 3. Filtra: Tira as respondidas da lista
-    questoes_ineditas = [q for q in todas_questoes_nivel if q['id'] not in ids_respondidos]
-    qtd_ineditas = len(questoes_ineditas)
+    db = await get_supabase_async()
+
+    # 1. Questões do banco (motor de seleção + sinal para o pool)
+    dificuldade, questoes_escolhidas = await selecionar_do_estoque(db, ilha_id, user_id, dificuldade, quantidade)
+    qtd_escolhidas = len(questoes_escolhidas)
     
     sessao = []
-    
-    print(f"   🔍 Estoque Nível {dificuldade}: {len(todas_questoes_nivel)} total | {qtd_ineditas} inéditas.")
 
-    # 4. Lógica de Abastecimento
-    if qtd_ineditas >= quantidade:
-        # Temos inéditas suficientes!
-        sessao = random.sample(questoes_ineditas, quantidade)
-        print("   ✅ Usando questões inéditas do banco.")
+    # 2. Lógica de Abastecimento
+    if qtd_escolhidas >= quantidade:
+        # Temos elegíveis suficientes! (o sorteio já foi feito pelo motor)
+        sessao = questoes_escolhidas
+        print("   ✅ Usando questões do banco.")
     else:
-        # Faltam questões inéditas!
-        faltam = quantidade - qtd_ineditas
-        print(f"   ⚠️ Faltam {faltam} questões inéditas. Acionando IA...")
-        
-        # Aproveita as inéditas que já temos
-        sessao.extend(questoes_ineditas)
-        
-        # Busca o tema para a IA
-        lesson_resp = supabase.table("lessons").select("titulo").eq("id", ilha_id).single().execute()
-        tema = lesson_resp.data['titulo'] if lesson_resp.data else "Medicina"
+        # Faltam questões elegíveis!
+        faltam = quantidade - qtd_escolhidas
+        print(f"   ⚠️ Faltam {faltam} questões. Acionando IA...")
         
-        # PROMPT COM DIFICULDADE
-        prompt = f"""
-        Você é um preceptor médico. Crie {faltam} questões de múltipla escolha INÉDITAS sobre: '{tema}'.
-        
-        NÍVEL DE DIFICULDADE: {dificuldade.upper()}
-        { "(Conceitos básicos, definições, anatomia)" if dificuldade == "Fácil" else 
-          "(Fisiopatologia, diagnóstico, casos clínicos simples)" if dificuldade == "Médio" else 
-          "(Conduta, complicações, casos complexos, detalhes técnicos)" }
-        
-        IMPORTANTE: Varie os subtemas para não repetir assuntos anteriores.
-        
-        Retorne APENAS JSON válido:
-        [
-            {{
-                "enunciado": "...",
-                "alternativa_a": "...",
-                "alternativa_b": "...",
-                "alternativa_c": "...",
-                "alternativa_d": "...",
-                "correta": "A",
-                "explicacao": "...",
-                "dificuldade": "{dificuldade}"
-            }}
-        ]
-        """
+        # Aproveita as que já temos
+        sessao.extend(questoes_escolhidas)
         
         try:
-            ai_resp = ai_model.generate_content(prompt)
-            texto_json = ai_resp.text.replace("```json", "").replace("```", "").strip()
-            novas_questoes = json.loads(texto_json)
-            if isinstance(novas_questoes, dict): novas_questoes = [novas_questoes]
-            
-            for q in novas_questoes:
-                q['lesson_id'] = ilha_id
-                q['dificuldade'] = dificuldade # Força a etiqueta certa
-                q['correta'] = q['correta'].strip().upper()
-                
-                # Salva no banco
-                res_insert = supabase.table("questions").insert(q).execute()
-                sessao.append(res_insert.data[0])
-                
-            print(f"   ✅ {len(novas_questoes)} novas questões geradas e salvas!")
+            # Single-flight: requests simultâneos da mesma ilha/nível/balde esperam
+            # UMA geração. O excedente do balde fica no banco como estoque.
+            balde = balde_geracao(faltam)
+
+            async def gerar_e_salvar():
+                # Mesmo prompt e mesmo caminho de insert usados pelo pool em background
+                novas = await gerar_questoes_ia(ai_model, ilha_id, balde, dificuldade)
+                return await salvar_questoes(db, novas)
+
+            novas_questoes, lider = await geracoes_em_voo.executar((ilha_id, dificuldade, balde), gerar_e_salvar)
+
+            # Saída compartilhada: aplica o filtro de inéditas DESTE usuário
+            ids_na_sessao = {q['id'] for q in sessao}
+            candidatas = [q for q in novas_questoes if q['id'] not in ids_na_sessao]
+            if not lider:
+                candidatas = await sem_ja_respondidas(db, user_id, candidatas)
+
+            sessao.extend(candidatas[:faltam])
+            origem = "geradas e salvas" if lider else "aproveitadas de geração em andamento"
+            print(f"   ✅ {len(novas_questoes)} novas questões {origem}!")
             
         except Exception as e:
             print(f"   ❌ Erro na IA: {e}")
-            # Fallback: Se a IA falhar, completa com repetidas para não travar
-            questoes_respondidas = [q for q in todas_questoes_nivel if q['id'] in ids_respondidos]
-            if questoes_respondidas:
-                falta_preencher = quantidade - len(sessao)
-                if falta_preencher > 0:
-                    sessao.extend(random.sample(questoes_respondidas, min(len(questoes_respondidas), falta_preencher)))
+
+        # Fallback: IA falhou, o dedup/validação descartou parte do lote ou as
+        # geradas já tinham sido respondidas: completa com repetidas para não travar
+        falta_preencher = quantidade - len(sessao)
+        if falta_preencher > 0:
+            sessao.extend(await completar_com_repetidas(db, ilha_id, dificuldade, sessao, falta_preencher))
 
     random.shuffle(sessao)
-    return sessao[:quantidade]
+    sessao = sessao[:quantidade]
+    return sessao
+
+async def selecionar_do_estoque(db, ilha_id, user_id, dificuldade, quantidade):
+    """
+    Parte da sessão que não depende da IA (compartilhada com a versão em stream).
+    Retorna (nível principal, questões do banco escolhidas pelo motor de seleção).
+    """
+    # Candidatas da ilha em formato colunar -> arrays NumPy -> sorteio ponderado
+    # (ver database/create_candidatas_sessao_rpc.sql). Traz também o θ do aluno na ilha.
+    colunas = (await db.rpc("get_candidatas_sessao", {
+        "p_user_id": user_id,
+        "p_lesson_id": ilha_id
+    }).execute()).data or {}
+    candidatas_ilha = CandidatasIlha(colunas)
+
+    adaptativo = dificuldade.lower() in MODOS_ADAPTATIVOS
+    if adaptativo:
+        theta = colunas.get("theta") or 0.0
+        plano = plano_sessao(theta, quantidade)
+        dificuldade = next(iter(plano))  # Nível principal: usado pelo pool, pela IA e pelo fallback
+        print(f"🎲 Sessão Ilha {ilha_id} | User {user_id} | Adaptativa (θ={theta:+.2f}): {plano}")
+    else:
+        plano = {dificuldade: quantidade}
+        print(f"🎲 Sessão Ilha {ilha_id} | User {user_id} | Nível: {dificuldade}")
+
+    ids_escolhidos = []
+    for nivel, n in plano.items():
+        ids_escolhidos += candidatas_ilha.sortear(n, nivel, excluir=ids_escolhidos)
+    if adaptativo and len(ids_escolhidos) < quantidade:
+        # Algum nível sem estoque: completa com os vizinhos (ordem do plano) antes da IA
+        for nivel in plano:
+            ids_escolhidos += candidatas_ilha.sortear(quantidade - len(ids_escolhidos), nivel, excluir=ids_escolhidos)
+    qtd_ineditas = candidatas_ilha.contar_ineditas(dificuldade)
+
+    questoes_escolhidas = []
+    if ids_escolhidos:
+        linhas = await db.table("questions").select("*").in_("id", ids_escolhidos).execute()
+        questoes_escolhidas = linhas.data
+
+    print(f"   🔍 Estoque Nível {dificuldade}: {qtd_ineditas} inéditas | {len(questoes_escolhidas)} elegíveis na sessão (pedidas: {quantidade}).")
+
+    # Avisa o pool: se o estoque de inéditas estiver baixando, ele reabastece em background
+    if reabastecedor:
+        reabastecedor.sinalizar(ilha_id, dificuldade, urgente=qtd_ineditas < quantidade)
+    return dificuldade, questoes_escolhidas
+
+def balde_geracao(faltam):
+    return -(-faltam // TAMANHO_BALDE_GERACAO) * TAMANHO_BALDE_GERACAO
+
+async def sem_ja_respondidas(db, user_id, questoes):
+    """Tira as que o usuário já respondeu (saída de uma geração de outro request)."""
+    if not questoes:
+        return questoes
+    ja_respondidas = await db.table("user_history")\
+        .select("question_id")\
+        .eq("user_id", user_id)\
+        .in_("question_id", [q['id'] for q in questoes])\
+        .execute()
+    ids_respondidos = {h['question_id'] for h in ja_respondidas.data}
+    return [q for q in questoes if q['id'] not in ids_respondidos]
+
+async def completar_com_repetidas(db, ilha_id, dificuldade, sessao, falta_preencher):
+    """Fallback quando a IA falha: questões já vistas da ilha, para não travar a sessão."""
+    ids_na_sessao = {q['id'] for q in sessao}
+    repetidas = await db.table("questions")\
+        .select("*")\
+        .eq("lesson_id", ilha_id)\
+        .eq("dificuldade", dificuldade)\
+        .limit(falta_preencher + len(ids_na_sessao))\
+        .execute()
+    questoes_respondidas = [q for q in repetidas.data if q['id'] not in ids_na_sessao]
+    if not questoes_respondidas:
+        return []
+    return random.sample(questoes_respondidas, min(len(questoes_respondidas), falta_preencher))
+
+@app.get("/praticar/session/{ilha_id}/stream")
+async def get_sessao_treino_stream(ilha_id: int, user_id: str, dificuldade: str = "Fácil", quantidade: int = 5):
+    """
+    A mesma sessão do /praticar/session, entregue por Server-Sent Events.
+    Primeiro saem as questões do banco; se faltar, cada questão da IA é
+    enviada assim que o objeto dela fecha no stream do Gemini (e é gravada),
+    em vez de esperar o array inteiro. A geração passa pelo mesmo single-flight
+    da rota sem stream: requests simultâneos da ilha esperam a do primeiro.
+    Eventos: `questao` (uma questão por evento) e `fim` ({"total": n}).
+    """
+    db = await get_supabase_async()
+    dificuldade, questoes_escolhidas = await selecionar_do_estoque(db, ilha_id, user_id, dificuldade, quantidade)
+    random.shuffle(questoes_escolhidas)
+
+    async def questoes_da_ia(faltam):
+        # Mesma chave do single-flight da rota sem stream: numa aula, só o
+        # primeiro request gera; os outros recebem as questões que ele gravou
+        balde = balde_geracao(faltam)
+        seguidoras = []
+        async for q, lider in geracoes_em_voo.executar_em_stream(
+                (ilha_id, dificuldade, balde),
+                lambda: gerar_e_salvar_em_stream(ai_model, db, ilha_id, balde, dificuldade)):
+            if lider:
+                yield q
+            else:
+                seguidoras.append(q)
+        for q in await sem_ja_respondidas(db, user_id, seguidoras):
+            yield q
+
+    async def eventos():
+        sessao = questoes_escolhidas[:quantidade]
+        for q in sessao:
+            yield evento_sse("questao", q)
+
+        faltam = quantidade - len(sessao)
+        if faltam > 0:
+            print(f"   ⚠️ Faltam {faltam} questões. Acionando IA em stream...")
+            try:
+                async for q in questoes_da_ia(faltam):
+                    if len(sessao) >= quantidade:
+                        break
+                    if any(q['id'] == s['id'] for s in sessao):
+                        continue
+                    sessao.append(q)
+                    yield evento_sse("questao", q)
+            except Exception as e:
+                print(f"   ❌ Erro na IA (stream): {e}")
+
+            falta_preencher = quantidade - len(sessao)
+            if falta_preencher > 0:
+                repetidas = await completar_com_repetidas(db, ilha_id, dificuldade, sessao, falta_preencher)
+                for q in repetidas:
+                    sessao.append(q)
+                    yield evento_sse("questao", q)
+
+        yield evento_sse("fim", {"total": len(sessao)})
+
+    # X-Accel-Buffering: proxies (nginx) não seguram os eventos
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def evento_sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
 
 @app.get("/praticar/semelhante/{questao_id}")
-def get_questao_semelhante(questao_id: int):
+async def get_questao_semelhante(questao_id: int, user_id: Optional[str] = None):
     """
-    Gera questão semelhante usando a instância global da IA.
+    Questão semelhante: primeiro procura no banco vetorial (question_bank) um
+    vizinho próximo que o aluno ainda não respondeu; só chama a IA se não achar.
+    Hit/miss e tempos vão para question_generation_logs.
     """
+    inicio_total = time.perf_counter()
+    db = await get_supabase_async()
+
     # 1. Busca a original
-    original = supabase.table("questions").select("*").eq("id", questao_id).single().execute()
+    original = await db.table("questions").select("*").eq("id", questao_id).single().execute()
     if not original.data:
         raise HTTPException(status_code=404, detail="Questão original não encontrada")
     
     q_orig = original.data
+    log = {"vector_query": q_orig['enunciado'][:200], "vector_matches_count": 0, "ai_generated_count": 0}
+
+    # 2. Vetor primeiro (embedding do enunciado + match_questions)
+    inicio_vetor = time.perf_counter()
+    try:
+        vizinha = await buscar_semelhante_no_banco(db, q_orig, user_id, log)
+    except Exception as e:
+        print(f"   ⚠️ Busca vetorial falhou, seguindo para a IA: {e}")
+        vizinha = None
+    log["vector_search_ms"] = int((time.perf_counter() - inicio_vetor) * 1000)
+
+    if vizinha:
+        print(f"🧭 Semelhante da questão {questao_id} veio do banco vetorial (questão {vizinha['id']}).")
+        log["vector_hit_rate"] = 1.0
+        registrar_log_geracao(db, log, inicio_total)
+        return vizinha
+
+    # 3. Miss: gera pela IA
     print(f"🤖 Gerando semelhante para questão ID {questao_id}...")
     
     prompt = f"""
     Baseado nesta questão de medicina: "{q_orig['enunciado']}"
-    Crie uma NOVA questão inédita testando o MESMO CONCEITO, mas com cenário diferente.
-    Retorne apenas JSON com as chaves padrão.
+    Crie {SEMELHANTE_VARIANTES} NOVAS questões inéditas testando o MESMO CONCEITO, cada uma com cenário diferente.
+    Retorne apenas um array JSON; cada questão com as chaves padrão.
     """
 
+    def interpretar_variacoes(texto):
+        variacoes = json.loads(texto)
+        return [variacoes] if isinstance(variacoes, dict) else variacoes
+
     try:
-        # Reutiliza instância global
-        response = ai_model.generate_content(prompt)
-        questao_json = json.loads(response.text)
-
-        nova_questao = {
-            "lesson_id": q_orig['lesson_id'],
-            "enunciado": questao_json["enunciado"],
-            "alternativa_a": questao_json["alternativa_a"],
-            "alternativa_b": questao_json["alternativa_b"],
-            "alternativa_c": questao_json["alternativa_c"],
-            "alternativa_d": questao_json["alternativa_d"],
-            "correta": questao_json["correta"],
-            "explicacao": questao_json["explicacao"]
-        }
-        
-        insert_resp = supabase.table("questions").insert(nova_questao).execute()
-        return insert_resp.data[0]
+        # Reutiliza instância global. Cache da IA: as variações que sobrarem
+        # atendem o próximo pedido para a mesma original sem chamar o Gemini.
+        # Variação clone da original (ou de outra ainda não gravada) nunca é
+        # inserida: tenta a próxima uma vez e, se ainda for clone, serve uma existente.
+        inicio_ia = time.perf_counter()
+        log["vector_hit_rate"] = 0.0
+        clone_de = None
+        for _ in range(SEMELHANTE_TENTATIVAS):
+            variacoes = await cache_ia.itens(ai_model, prompt, interpretar_variacoes, 1, POLITICAS["semelhante"])
+            nova_questao = montar_variacao(q_orig, variacoes[0])
+
+            aceitas, clones = await filtrar_clones(db, [nova_questao])
+            if not clones:
+                break
+            if isinstance(clones[0][1], int) and clones[0][1] != questao_id:
+                clone_de = clones[0][1]
+            print(f"   🧬 Variação gerada era clone de {clones[0][1]}; descartada.")
+        log["ai_generation_ms"] = int((time.perf_counter() - inicio_ia) * 1000)
+
+        if clones:
+            # Só clones: a existente parecida (se não for a original) ou a própria original
+            existente = None
+            if clone_de is not None:
+                resp = await db.table("questions").select("*").eq("id", clone_de).execute()
+                existente = resp.data[0] if resp.data else None
+            registrar_log_geracao(db, log, inicio_total)
+            return existente or q_orig
+
+        try:
+            insert_resp = await db.table("questions").insert(nova_questao).execute()
+            nova = insert_resp.data[0]
+            if aceitas:
+                await registrar_embeddings(db, [nova])
+        finally:
+            deduplicador.descartar(aceitas)
+        log["ai_generated_count"] = 1
+        registrar_log_geracao(db, log, inicio_total)
+
+        # Em background: vetoriza a nova e publica no question_bank (o próximo pedido acha)
+        em_background(publicar_no_banco_vetorial(db, nova))
+        return nova
 
     except Exception as e:
         print("❌ Erro IA Semelhante:", e)
         raise HTTPException(status_code=500, detail="Erro ao gerar variação.")
 
+def montar_variacao(q_orig, questao_json):
+    """Variação gerada pela IA no formato da tabela questions (mesma ilha e nível da original)."""
+    return {
+        "lesson_id": q_orig['lesson_id'],
+        "enunciado": questao_json["enunciado"],
+        "alternativa_a": questao_json["alternativa_a"],
+        "alternativa_b": questao_json["alternativa_b"],
+        "alternativa_c": questao_json["alternativa_c"],
+        "alternativa_d": questao_json["alternativa_d"],
+        "correta": questao_json["correta"],
+        "explicacao": questao_json["explicacao"],
+        "dificuldade": q_orig.get('dificuldade')
+    }
+
+async def buscar_semelhante_no_banco(db, q_orig, user_id, log):
+    """
+    Vizinho mais próximo no question_bank que vira uma questão do quiz inédita
+    para o aluno. Retorna a linha de questions (criando a ponte se preciso) ou None.
+    """
+    vetor = await gerar_embedding(q_orig['enunciado'])
+    resp = await db.rpc("match_questions", {
+        "query_embedding": vetor,
+        "match_threshold": SEMELHANTE_LIMIAR,
+        "match_count": SEMELHANTE_CANDIDATOS,
+        "filter_topics": None,
+        "filter_difficulty": DIFICULDADE_BANCO.get(q_orig.get('dificuldade'))
+    }).select("id, statement, options, q_type, commentary, difficulty, distance").execute()
+
+    # Distância ~0 = a própria original (ou um clone dela): não serve como "semelhante"
+    vizinhos = [v for v in resp.data
+                if v['id'] != q_orig.get('question_bank_id') and v['distance'] >= SEMELHANTE_DISTANCIA_MIN]
+    log["vector_matches_count"] = len(vizinhos)
+    if vizinhos:
+        log["top1_distance"] = vizinhos[0]['distance']
+        log["top3_distances"] = [v['distance'] for v in vizinhos[:3]]
+    else:
+        return None
+
+    # Questões do quiz já ligadas a esses vizinhos
+    ligadas = await db.table("questions").select("*")\
+        .in_("question_bank_id", [v['id'] for v in vizinhos]).execute()
+    por_banco = {q['question_bank_id']: q for q in ligadas.data}
+
+    respondidas = set()
+    if user_id and ligadas.data:
+        hist = await db.table("user_history").select("question_id")\
+            .eq("user_id", user_id)\
+            .in_("question_id", [q['id'] for q in ligadas.data]).execute()
+        respondidas = {h['question_id'] for h in hist.data}
+
+    for v in vizinhos:  # Já vêm do mais próximo para o mais distante
+        q = por_banco.get(v['id'])
+        if q:
+            if q['id'] not in respondidas and q['id'] != q_orig['id']:
+                return q
+            continue
+        # Vizinho ainda sem ponte: converte para o formato A-D e grava uma vez só.
+        # Índice único em question_bank_id: se outro request criou a ponte antes, usa a dele.
+        nova = de_question_bank(v, q_orig['lesson_id'], q_orig.get('dificuldade'))
+        if nova:
+            insert_resp = await db.table("questions")\
+                .upsert({**nova, "question_bank_id": v['id']}, on_conflict="question_bank_id", ignore_duplicates=True)\
+                .execute()
+            if insert_resp.data:
+                return insert_resp.data[0]
+            existente = await db.table("questions").select("*").eq("question_bank_id", v['id']).execute()
+            if existente.data and existente.data[0]['id'] not in respondidas:
+                return existente.data[0]
+    return None
+
+async def publicar_no_banco_vetorial(db, questao):
+    """Vetoriza uma questão gerada e cria o item equivalente no question_bank (com ponte)."""
+    try:
+        vetor = await gerar_embedding(questao['enunciado'])
+        item = para_question_bank(questao, tema_da_ilha(questao['lesson_id']))
+        resp = await db.table("question_bank").insert({**item, "embedding": vetor, "embedding_status": "completed"}).execute()
+        await db.table("questions").update({"question_bank_id": resp.data[0]['id']}).eq("id", questao['id']).execute()
+    except Exception as e:
+        print(f"   ⚠️ Questão {questao.get('id')} não publicada no banco vetorial: {e}")
+
+async def filtrar_clones(db, questoes):
+    """Dedup por embedding sem deixar uma falha da API derrubar a rota."""
+    try:
+        return await deduplicador.filtrar(questoes, db)
+    except Exception as e:
+        print(f"   ⚠️ Dedup indisponível: {e}")
+        return questoes, []
+
+async def registrar_embeddings(db, salvas):
+    try:
+        await deduplicador.registrar(salvas, db)
+    except Exception as e:
+        print(f"   ⚠️ Embeddings não gravados: {e}")
+
+def registrar_log_geracao(db, log, inicio_total):
+    """Telemetria em question_generation_logs, sem segurar a resposta."""
+    log["total_ms"] = int((time.perf_counter() - inicio_total) * 1000)
+
+    async def gravar():
+        try:
+            await db.table("question_generation_logs").insert(log).execute()
+        except Exception as e:
+            print(f"   ⚠️ Falha ao gravar telemetria: {e}")
+
+    em_background(gravar())
+
 @app.get("/praticar/{trilha_id}") 
-def get_questao_aleatoria(trilha_id: int):
+async def get_questao_aleatoria(trilha_id: int):
     # Lógica mantida igual, pois é puramente banco de dados
-    lessons = supabase.table("lessons").select("id").eq("module_id", trilha_id).execute()
+    db = await get_supabase_async()
+    lessons = await db.table("lessons").select("id").eq("module_id", trilha_id).execute()
     lesson_ids = [l['id'] for l in lessons.data]
     
     if not lesson_ids:
         raise HTTPException(status_code=404, detail="Sem lições nesta trilha")
 
-    questions = supabase.table("questions").select("*").in_("lesson_id", lesson_ids).limit(1).execute()
+    questions = await db.table("questions").select("*").in_("lesson_id", lesson_ids).limit(1).execute()
     
     if not questions.data:
         raise HTTPException(status_code=404, detail="Sem questões cadastradas")
@@ -240,152 +642,257 @@ def get_questao_aleatoria(trilha_id: int):
 # ==========================================
 
 @app.post("/historico")
-def registrar_tentativa(tentativa: Tentativa):
+async def registrar_tentativa(tentativa: Tentativa):
     data = tentativa.dict()
+
+    # Write-behind: responde na hora; a gravação sai em lote (com spool em disco)
+    if buffer_historico:
+        data["created_at"] = datetime.now(timezone.utc).isoformat()
+        if buffer_historico.registrar(data):
+            return {"status": "enfileirado"}
+        # Fila cheia: cai para a gravação direta abaixo
+
     try:
-        supabase.table("user_history").insert(data).execute()
-        return {"status": "registrado"}
+        db = await get_supabase_async()
+        await db.table("user_history").insert(data).execute()
     except Exception as e:
         print("Erro ao salvar histórico:", e)
         raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "registrado"}
+
+@app.get("/metricas/historico")
+def get_metricas_historico():
+    """Profundidade da fila e latência de flush do write-behind."""
+    if not buffer_historico:
+        return {"write_behind": False}
+    return {"write_behind": True, **buffer_historico.snapshot_metricas()}
+
+@app.get("/metricas/cache-ia")
+def get_metricas_cache_ia():
+    """Hits (memória/banco), misses e itens guardados no estoque, por política."""
+    return cache_ia.snapshot_metricas()
+
+@app.get("/metricas/embeddings")
+def get_metricas_embeddings():
+    """Vazão (linhas/s) e falhas do worker de embeddings do question_bank."""
+    if not worker_embeddings:
+        return {"worker": False}
+    return {"worker": True, **worker_embeddings.snapshot_metricas()}
+
+LIMITE_ERROS_PADRAO = 200  # Front atual busca sem parâmetros: a primeira página cobre o caderno típico
+LIMITE_ERROS_MAX = 500
+
+
+def _ler_cursor_erros(antes: str):
+    """Cursor do /erros: '<last_wrong_at>|<question_id>' (só a data = formato antigo, sem desempate)."""
+    data, _, question_id = antes.rpartition("|")
+    if not data:
+        return antes, None
+    try:
+        return data, int(question_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
 
 @app.get("/erros/{user_id}")
-def get_erros_usuario(user_id: str):
+async def get_erros_usuario(
+    user_id: str,
+    response: Response,
+    limite: int = LIMITE_ERROS_PADRAO,
+    antes: Optional[str] = None,
+    since: Optional[str] = None,
+    completo: bool = True
+):
     """
-    Busca erros, mas verifica se eles já foram corrigidos (resolvida = True).
+    Caderno de erros paginado por data do último erro (mais recente primeiro).
+    Lê o estado materializado user_question_state: uma linha por questão errada,
+    correto para o histórico inteiro.
+    - antes: cursor devolvido no header X-Proximo-Cursor (próxima página):
+      data do último erro + question_id, para não pular nem repetir erros
+      com o mesmo last_wrong_at.
+    - since: só questões com tentativa depois dessa data (erros novos e erros
+      que acabaram de ser resolvidos), para o front atualizar incrementalmente.
+    - completo=false: omite dados_completos (payload enxuto para listas).
     """
+    limite = max(1, min(limite, LIMITE_ERROS_MAX))
+    cursor = _ler_cursor_erros(antes) if antes else None
     try:
-        # A MÁGICA DO DEEP JOIN + HISTÓRICO COMPLETO
-        # Removemos o filtro .eq("is_correct", False) para ver também os acertos recentes
-        query = """
-            created_at,
-            question_id,
-            is_correct,
-            questions (
-                *,
-                lesson:lessons (
-                    titulo,
-                    module:modules (
-                        nome,
-                        system:systems (
-                            nome,
-                            area:areas (
-                                nome
-                            )
-                        )
-                    )
-                )
-            )
-        """
-        
-        # Buscamos as últimas 1000 ações para garantir um bom histórico
-        response = supabase.table("user_history")\
-            .select(query)\
+        db = await get_supabase_async()
+
+        # 1. Uma página de questões erradas (índice parcial user_id, last_wrong_at, question_id)
+        query = db.table("user_question_state")\
+            .select("question_id, last_correct, last_wrong_at")\
             .eq("user_id", user_id)\
-            .order("created_at", desc=True)\
-            .limit(1000)\
-            .execute()
-        
-        erros_formatados = []
-        ids_adicionados = set()
-        
-        # Dicionário para saber o status ATUAL da questão
-        # Como a lista vem ordenada por data (mais recente primeiro),
-        # a primeira vez que virmos uma questão, saberemos seu status atual.
-        status_atual_questoes = {} # { id_questao: True/False }
+            .not_.is_("last_wrong_at", "null")
+        if cursor:
+            data_cursor, id_cursor = cursor
+            if id_cursor is None:
+                query = query.lt("last_wrong_at", data_cursor)
+            else:
+                query = query.or_(f'last_wrong_at.lt."{data_cursor}",'
+                                  f'and(last_wrong_at.eq."{data_cursor}",question_id.lt.{id_cursor})')
+        if since:
+            query = query.gt("last_attempt_at", since)
+        pagina = (await query.order("last_wrong_at", desc=True).order("question_id", desc=True)\
+            .limit(limite).execute()).data
+
+        if len(pagina) == limite:
+            ultimo = pagina[-1]
+            response.headers["X-Proximo-Cursor"] = f'{ultimo["last_wrong_at"]}|{ultimo["question_id"]}'
+        if not pagina:
+            return []
+
+        # 2. Questões da página numa consulta plana
+        colunas = "*" if completo else "id, enunciado, lesson_id"
+        questoes_resp = await db.table("questions").select(colunas)\
+            .in_("id", [e["question_id"] for e in pagina]).execute()
+        questoes = {q["id"]: q for q in questoes_resp.data}
+
+        # 3. Nomes da hierarquia vêm do mapa ilha -> caminho em cache (sem join aninhado)
+        await rodar_em_thread(curriculo.garantir)
 
-        for item in response.data:
-            q = item.get('questions')
+        erros_formatados = []
+        for estado in pagina:
+            q = questoes.get(estado["question_id"])
             if not q: continue
-            
-            q_id = item['question_id']
-            foi_acerto = item['is_correct']
-            
-            # 1. Registra o status mais recente dessa questão (se ainda não vimos)
-            if q_id not in status_atual_questoes:
-                status_atual_questoes[q_id] = foi_acerto
-            
-            # 2. Se este item for um ERRO, nós o mostramos na lista
-            if not foi_acerto:
-                # Dedupe: Só mostra 1 vez (o erro mais recente)
-                if q_id not in ids_adicionados:
-                    
-                    # Tratamento de Nulos na Hierarquia
-                    lesson = q.get('lesson') or {}
-                    module = lesson.get('module') or {}
-                    system = module.get('system') or {}
-                    area = system.get('area') or {}
-
-                    erros_formatados.append({
-                        "id": q['id'],
-                        "data_erro": item['created_at'],
-                        "enunciado": q['enunciado'],
-                        "dados_completos": q,
-                        "ilha": lesson.get('titulo', 'Geral'),
-                        "trilha": module.get('nome', 'Geral'),
-                        "sistema": system.get('nome', 'Geral'),
-                        "area": area.get('nome', 'Geral'),
-                        
-                        # AQUI ESTÁ A MÁGICA:
-                        # Se o status atual (mais recente) for True, então esse erro já foi superado!
-                        "resolvida": status_atual_questoes[q_id]
-                    })
-                    ids_adicionados.add(q_id)
+
+            item = {
+                "id": q["id"],
+                "data_erro": estado["last_wrong_at"],
+                "enunciado": q["enunciado"],
+                **curriculo.caminho_ilha(q.get("lesson_id")),
+                # Se a tentativa mais recente foi um acerto, esse erro já foi superado
+                "resolvida": estado["last_correct"],
+            }
+            if completo:
+                item["dados_completos"] = q
+            erros_formatados.append(item)
 
         return erros_formatados
 
     except Exception as e:
-        print("Erro profundo na busca de erros:", e)
+        print("Erro na busca de erros:", e)
         return []
     
+LIMITE_REVISAO_MAX = 200
+
+@app.get("/revisar/{user_id}")
+async def get_fila_revisao(user_id: str, limite: int = 20, completo: bool = True):
+    """
+    Questões com revisão vencida (SM-2), da mais atrasada para a mais recente.
+    Range scan no índice (user_id, due_at) de user_question_srs: o custo não
+    depende do tamanho do histórico do aluno.
+    """
+    limite = max(1, min(limite, LIMITE_REVISAO_MAX))
+    try:
+        db = await get_supabase_async()
+        agora = datetime.now(timezone.utc).isoformat()
+        vencidas = (await db.table("user_question_srs")\
+            .select("question_id, due_at, state, interval_days, repetitions, lapses")\
+            .eq("user_id", user_id)\
+            .lte("due_at", agora)\
+            .order("due_at")\
+            .limit(limite)\
+            .execute()).data
+        if not vencidas:
+            return []
+
+        colunas = "*" if completo else "id, enunciado, lesson_id"
+        questoes_resp = await db.table("questions").select(colunas)\
+            .in_("id", [v["question_id"] for v in vencidas]).execute()
+        questoes = {q["id"]: q for q in questoes_resp.data}
+        await rodar_em_thread(curriculo.garantir)
+
+        fila = []
+        for v in vencidas:
+            q = questoes.get(v["question_id"])
+            if not q: continue
+            item = {
+                "id": q["id"],
+                "due_at": v["due_at"],
+                "estado": v["state"],
+                "intervalo_dias": float(v["interval_days"]),
+                "repeticoes": v["repetitions"],
+                "lapsos": v["lapses"],
+                "enunciado": q["enunciado"],
+                **curriculo.caminho_ilha(q.get("lesson_id")),
+            }
+            if completo:
+                item["dados_completos"] = q
+            fila.append(item)
+        return fila
+
+    except Exception as e:
+        print("Erro na fila de revisão:", e)
+        return []
+
+def _intervalo_do_periodo(periodo: str, inicio: Optional[str], fim: Optional[str]):
+    """
+    Converte os filtros da rota em [inicio, fim) UTC. None = sem limite.
+    inicio/fim aceitam data (2026-01-31) ou data-hora ISO; datas em 'fim' incluem o dia todo.
+    """
+    if inicio or fim:
+        try:
+            dt_inicio = datetime.fromisoformat(inicio) if inicio else None
+            dt_fim = datetime.fromisoformat(fim) if fim else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Datas inválidas. Use o formato AAAA-MM-DD.")
+        if fim and len(fim) == 10:
+            dt_fim += timedelta(days=1)
+        return dt_inicio, dt_fim
+
+    if periodo == "tudo":
+        return None, None
+
+    dias = 7 if periodo == "7dias" else 30
+    return datetime.now(timezone.utc) - timedelta(days=dias), None
+
+def _dia_inicial(dt: Optional[datetime]):
+    # Os baldes são diários (UTC): o período começa no dia de `dt`
+    if not dt:
+        return None
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date().isoformat()
+
+def _dia_final(dt: Optional[datetime]):
+    # Limite exclusivo: um horário no meio do dia inclui aquele dia inteiro
+    if not dt:
+        return None
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc)
+    dia = dt.date()
+    if dt.time() != datetime.min.time():
+        dia += timedelta(days=1)
+    return dia.isoformat()
+
 @app.get("/perfil/stats/{user_id}")
-def get_user_stats(user_id: str, periodo: str = "tudo", inicio: Optional[str] = None, fim: Optional[str] = None):
-    # Lógica de View mantida
+async def get_user_stats(user_id: str, periodo: str = "tudo", inicio: Optional[str] = None, fim: Optional[str] = None):
+    # Soma dos baldes diários de user_stats_daily (ver database/create_user_stats_daily.sql):
+    # o custo depende do número de dias do período, não do número de tentativas.
+    dt_inicio, dt_fim = _intervalo_do_periodo(periodo, inicio, fim)
     try:
-        response = supabase.table("view_historico_completo").select("*").eq("user_id", user_id).execute()
-        historico_completo = response.data
+        db = await get_supabase_async()
+        response = await db.rpc("get_user_stats_rollup", {
+            "p_user_id": user_id,
+            "p_inicio": _dia_inicial(dt_inicio),
+            "p_fim": _dia_final(dt_fim)
+        }).execute()
+        stats = response.data
     except Exception as e:
         return {"erro": "Falha ao buscar dados"}
 
-    # ... (Lógica de filtro de data igual ao anterior) ...
-    # Para economizar espaço aqui, mantive a lógica de filtro
-    # Se quiser o código completo dessa parte novamente, me avise,
-    # mas o foco era otimizar a IA.
-    
-    # REPLICAÇÃO RÁPIDA DA LÓGICA DE DATA PARA NÃO QUEBRAR:
-    historico_filtrado = []
-    agora = datetime.now(timezone.utc)
-    if periodo == "tudo":
-        historico_filtrado = historico_completo
-    else:
-        dias = 7 if periodo == "7dias" else 30
-        data_corte = agora - timedelta(days=dias)
-        # (Lógica simplificada para caber)
-        for h in historico_completo:
-            try:
-                dt = datetime.fromisoformat(h['created_at'])
-                if dt >= data_corte: historico_filtrado.append(h)
-            except: continue
-            
-    total = len(historico_filtrado)
+    total = stats['total']
     if total == 0: return {"total": 0, "acertos": 0, "taxa_acerto": 0, "nivel": "Novato", "por_sistema": {}}
     
-    acertos = len([h for h in historico_filtrado if h['is_correct'] is True])
+    acertos = stats['acertos']
     taxa = int((acertos / total) * 100)
     
     # Nivel Vitalício
-    total_vital = len(historico_completo)
+    total_vital = stats['total_vitalicio']
     nivel = "Interno Júnior"
     if total_vital > 50: nivel = "Residente R1"
-    
-    desempenho = {}
-    for h in historico_filtrado:
-        sis = h.get('sistema') or "Geral"
-        if sis not in desempenho: desempenho[sis] = {'total': 0, 'acertos': 0}
-        desempenho[sis]['total'] += 1
-        if h['is_correct']: desempenho[sis]['acertos'] += 1
-
-    return {"total": total, "acertos": acertos, "taxa_acerto": taxa, "nivel": nivel, "por_sistema": desempenho}
+
+    return {"total": total, "acertos": acertos, "taxa_acerto": taxa, "nivel": nivel, "por_sistema": stats['por_sistema']}
 # --- MODELO DE DADOS ---
 # --- MODELO DE DADOS ---
 class ProgressoUpdate(BaseModel):
@@ -393,62 +900,79 @@ class ProgressoUpdate(BaseModel):
     lesson_id: int
     nivel_novo: int
 
+class ItemProgresso(BaseModel):
+    lesson_id: int
+    nivel_novo: int
+
+class ProgressoLote(BaseModel):
+    user_id: str
+    itens: List[ItemProgresso]
+
+MAX_ITENS_PROGRESSO_LOTE = 1000
+
 # ==========================================
 # ROTAS DE PROGRESSO (CORRIGIDAS)
 # ==========================================
 
 @app.post("/progresso")
-def atualizar_progresso(dados: ProgressoUpdate):
+async def atualizar_progresso(dados: ProgressoUpdate):
     """
     Salva o nível. Se o usuário já estava no nível 3 e mandou nível 1, a gente IGNORA.
-    Só salvamos se ele avançou.
+    A comparação acontece no próprio upsert (RPC salvar_progresso): uma ida ao banco
+    e nenhum save concorrente consegue regredir o nível.
     """
     print(f"💾 Tentando salvar progresso: User {dados.user_id} | Ilha {dados.lesson_id} | Nível {dados.nivel_novo}")
     
     try:
-        # 1. Verifica o nível atual no banco
-        atual = supabase.table("user_progress")\
-            .select("nivel_atual")\
-            .eq("user_id", dados.user_id)\
-            .eq("lesson_id", dados.lesson_id)\
-            .execute()
-            
-        nivel_banco = 0
-        if atual.data:
-            nivel_banco = atual.data[0]['nivel_atual']
-        
-        print(f"   ↳ Nível no banco: {nivel_banco}. Nível novo: {dados.nivel_novo}")
-
-        # 2. Só atualiza se progrediu (ou se for o primeiro registro)
-        if dados.nivel_novo > nivel_banco:
-            # Upsert: O segredo é o on_conflict
-            data = {
-                "user_id": dados.user_id,
-                "lesson_id": dados.lesson_id,
-                "nivel_atual": dados.nivel_novo,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # Removemos o .execute() do final do upsert e tratamos o response corretamente
-            res = supabase.table("user_progress").upsert(data, on_conflict="user_id, lesson_id").execute()
-            print("   ✅ Progresso SALVO com sucesso!")
-            return {"status": "Atualizado", "nivel": dados.nivel_novo}
-        else:
-            print("   zzz Nível igual ou inferior. Não precisa salvar.")
-            return {"status": "Mantido", "nivel": nivel_banco}
+        db = await get_supabase_async()
+        res = await db.rpc("salvar_progresso", {
+            "p_user_id": dados.user_id,
+            "p_lesson_id": dados.lesson_id,
+            "p_nivel": dados.nivel_novo
+        }).execute()
+
+        print(f"   ✅ {res.data['status']} (nível {res.data['nivel']})")
+        return res.data
 
     except Exception as e:
         print(f"   ❌ ERRO AO SALVAR: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/progresso/lote")
+async def atualizar_progresso_lote(dados: ProgressoLote):
+    """
+    Sincronização offline: várias ilhas em uma chamada (mesma regra do /progresso).
+    Retorna [{lesson_id, status, nivel}].
+    """
+    if len(dados.itens) > MAX_ITENS_PROGRESSO_LOTE:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_ITENS_PROGRESSO_LOTE} ilhas por lote.")
+    if not dados.itens:
+        return []
+
+    try:
+        db = await get_supabase_async()
+        res = await db.rpc("salvar_progresso_lote", {
+            "p_user_id": dados.user_id,
+            "p_itens": [item.dict() for item in dados.itens]
+        }).execute()
+
+        atualizadas = sum(1 for r in res.data if r["status"] == "Atualizado")
+        print(f"💾 Lote de progresso: User {dados.user_id} | {atualizadas}/{len(res.data)} ilhas avançaram")
+        return res.data
+
+    except Exception as e:
+        print(f"   ❌ ERRO AO SALVAR LOTE: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/progresso/{user_id}")
-def get_progresso_geral(user_id: str):
+async def get_progresso_geral(user_id: str):
     """
     Retorna o mapa completo de progresso do usuário.
     """
     print(f"📥 Buscando progresso total para: {user_id}")
     try:
-        response = supabase.table("user_progress").select("lesson_id, nivel_atual").eq("user_id", user_id).execute()
+        db = await get_supabase_async()
+        response = await db.table("user_progress").select("lesson_id, nivel_atual").eq("user_id", user_id).execute()
         
         # Converte para dicionário simples: { 101: 2, 102: 5 }
         mapa = {}
@@ -0,0 +1,127 @@
+import os
+import time
+import numpy as np
+
+# ==============================================================================
+# 🎯 MOTOR DE SELEÇÃO DE QUESTÕES (vetorizado)
+# ==============================================================================
+# As candidatas da ilha chegam da RPC get_candidatas_sessao em formato colunar
+# e viram arrays NumPy. Cada questão recebe uma nota (fórmula vetorizada e
+# configurável) e a sessão é um sorteio ponderado SEM reposição
+# (Efraimidis-Spirakis: chave = log(u) / peso, pega as k maiores).
+#
+# Elegíveis:
+#   - inéditas (o aluno nunca viu);
+#   - erradas por último, depois de SELECAO_DIAS_MIN_ERRO dias (revisão);
+#   - acertadas por último, depois de SELECAO_DIAS_MIN_ACERTO dias.
+# Quanto mais tempo desde a última vez, maior o peso da revisão (meia-vida).
+# Questões "informativas" (acerto global perto de 50%) ganham um bônus.
+# ==============================================================================
+
+CODIGO_DIFICULDADE = {"Fácil": 0, "Médio": 1, "Difícil": 2}
+
+PESOS_PADRAO = {
+    "inedita": float(os.getenv("SELECAO_PESO_INEDITA", "3.0")),
+    "revisar_erro": float(os.getenv("SELECAO_PESO_REVISAR_ERRO", "2.0")),
+    "revisar_acerto": float(os.getenv("SELECAO_PESO_REVISAR_ACERTO", "0.3")),
+    "informativa": float(os.getenv("SELECAO_PESO_INFORMATIVA", "1.0")),
+    "dias_min_erro": float(os.getenv("SELECAO_DIAS_MIN_ERRO", "1")),
+    "dias_min_acerto": float(os.getenv("SELECAO_DIAS_MIN_ACERTO", "30")),
+    "meia_vida_dias": float(os.getenv("SELECAO_MEIA_VIDA_REVISAO", "7")),
+}
+
+_rng = np.random.default_rng()
+
+
+class CandidatasIlha:
+    """Candidatas de uma ilha para um aluno, em arrays paralelos."""
+
+    def __init__(self, colunas):
+        self.ids = np.asarray(colunas.get("ids") or [], dtype=np.int64)
+        self.dificuldade = np.array(
+            [CODIGO_DIFICULDADE.get(d, -1) for d in colunas.get("dificuldades") or []], dtype=np.int8)
+        tentativas = np.asarray(colunas.get("tentativas") or [], dtype=np.float32)
+        acertos = np.asarray(colunas.get("acertos") or [], dtype=np.float32)
+        # Acerto global suavizado (Laplace): questão sem respostas fica em 50%
+        self.acerto_global = (acertos + 1) / (tentativas + 2)
+        # Último resultado do aluno: NaN = nunca viu, 0 = errou, 1 = acertou
+        self.ultimo = np.array(colunas.get("ultimo") or [], dtype=np.float32)
+        self.dias = np.array(colunas.get("dias") or [], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _mascara(self, dificuldade):
+        if dificuldade is None:
+            return np.ones(len(self.ids), dtype=bool)
+        return self.dificuldade == CODIGO_DIFICULDADE.get(dificuldade, -1)
+
+    def pontuar(self, pesos=PESOS_PADRAO):
+        """Nota de cada candidata (0 = não elegível nesta sessão)."""
+        inedita = np.isnan(self.ultimo)
+        dias = np.nan_to_num(self.dias, nan=0.0)
+        ganho_espacamento = 1 - np.exp2(-dias / pesos["meia_vida_dias"])
+
+        nota = np.where(inedita, pesos["inedita"], 0.0)
+        nota += np.where((self.ultimo == 0) & (dias >= pesos["dias_min_erro"]),
+                         pesos["revisar_erro"] * ganho_espacamento, 0.0)
+        nota += np.where((self.ultimo == 1) & (dias >= pesos["dias_min_acerto"]),
+                         pesos["revisar_acerto"] * ganho_espacamento, 0.0)
+
+        informativa = 4 * self.acerto_global * (1 - self.acerto_global)
+        return nota * (1 + pesos["informativa"] * informativa)
+
+    def contar_ineditas(self, dificuldade=None):
+        return int(np.count_nonzero(np.isnan(self.ultimo) & self._mascara(dificuldade)))
+
+    def sortear(self, quantidade, dificuldade=None, excluir=(), pesos=PESOS_PADRAO, rng=None):
+        """
+        Até `quantidade` ids elegíveis, sorteados com probabilidade proporcional
+        à nota e sem repetição. Devolve menos se não houver elegíveis suficientes.
+        """
+        if quantidade <= 0 or not len(self.ids):
+            return []
+        nota = self.pontuar(pesos)
+        nota[~self._mascara(dificuldade)] = 0
+        if excluir:
+            nota[np.isin(self.ids, list(excluir))] = 0
+
+        elegiveis = np.flatnonzero(nota > 0)
+        k = min(quantidade, len(elegiveis))
+        if k == 0:
+            return []
+
+        u = (rng or _rng).random(len(elegiveis))
+        chaves = np.log(u) / nota[elegiveis]
+        escolhidas = np.argpartition(-chaves, k - 1)[:k]
+        escolhidas = escolhidas[np.argsort(-chaves[escolhidas])]
+        return self.ids[elegiveis[escolhidas]].tolist()
+
+
+if __name__ == "__main__":
+    # Micro-benchmark com uma ilha sintética (não toca no banco)
+    n = int(os.getenv("SELECAO_BENCH_N", "5000"))
+    rng = np.random.default_rng(42)
+    vistas = rng.random(n) < 0.6
+    colunas = {
+        "ids": list(range(1, n + 1)),
+        "dificuldades": rng.choice(list(CODIGO_DIFICULDADE), n).tolist(),
+        "tentativas": rng.integers(0, 200, n).tolist(),
+        "acertos": rng.integers(0, 100, n).tolist(),
+        "ultimo": [bool(r) if v else None for v, r in zip(vistas, rng.random(n) < 0.7)],
+        "dias": [float(d) if v else None for v, d in zip(vistas, rng.random(n) * 60)],
+    }
+
+    inicio = time.perf_counter()
+    candidatas = CandidatasIlha(colunas)
+    montagem_ms = (time.perf_counter() - inicio) * 1000
+
+    tempos = []
+    for _ in range(1000):
+        inicio = time.perf_counter()
+        candidatas.sortear(10, "Médio")
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+
+    print(f"🎯 {n} candidatas | montagem dos arrays: {montagem_ms:.2f} ms")
+    print(f"   sorteio de 10: p50 {tempos[len(tempos) // 2]:.3f} ms | p99 {tempos[int(len(tempos) * 0.99)]:.3f} ms")
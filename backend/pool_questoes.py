@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from database import get_supabase_async
+from gerador_questoes import gerar_questoes_ia, salvar_questoes
+from limitador import LimitadorTaxa
+
+# ==============================================================================
+# 🏭 POOL DE PRÉ-GERAÇÃO (Reabastecedor em background)
+# ==============================================================================
+# Mantém um estoque mínimo de questões "inéditas para a maioria" por
+# (ilha, dificuldade). A rota de sessão só sinaliza; quem chama o Gemini é o
+# worker, limitado por um token bucket global. Assim o aluno quase nunca
+# espera a IA dentro da request.
+# ==============================================================================
+
+ESTOQUE_MINIMO = int(os.getenv("POOL_ESTOQUE_MINIMO", "20"))
+MARCA_REABASTECER = int(os.getenv("POOL_MARCA_REABASTECER", "10"))
+MAX_RESPONDENTES = int(os.getenv("POOL_MAX_RESPONDENTES", "3"))
+LOTE_GERACAO = int(os.getenv("POOL_LOTE_GERACAO", "5"))
+GERACOES_POR_MINUTO = int(os.getenv("POOL_GERACOES_POR_MINUTO", "10"))
+NUM_WORKERS = int(os.getenv("POOL_WORKERS", "2"))
+INTERVALO_VERIFICACAO = int(os.getenv("POOL_INTERVALO_VERIFICACAO", "60"))  # segundos por chave
+MAX_RODADAS = int(os.getenv("POOL_MAX_RODADAS", "6"))  # Gerações por reabastecimento (teto de cota por chave)
+
+
+class ReabastecedorQuestoes:
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self.limitador = LimitadorTaxa(GERACOES_POR_MINUTO)
+        self._fila = asyncio.Queue()
+        self._pendentes = set()
+        self._ultima_verificacao = {}
+        self._workers = []
+
+    def sinalizar(self, ilha_id, dificuldade, urgente=False):
+        """
+        Chamado pela rota de sessão. Não bloqueia: só agenda uma verificação de
+        estoque para a chave (no máximo uma a cada INTERVALO_VERIFICACAO).
+        `urgente` = o usuário já ficou sem inéditas; agenda na hora.
+        """
+        chave = (ilha_id, dificuldade)
+        if chave in self._pendentes:
+            return
+
+        ultima = self._ultima_verificacao.get(chave)
+        if not urgente and ultima is not None and time.monotonic() - ultima < INTERVALO_VERIFICACAO:
+            return
+
+        self._pendentes.add(chave)
+        self._fila.put_nowait(chave)
+
+    async def iniciar(self):
+        self._workers = [asyncio.create_task(self._loop(i)) for i in range(NUM_WORKERS)]
+        print(f"🏭 Pool de questões ativo: {NUM_WORKERS} workers | estoque mínimo {ESTOQUE_MINIMO} "
+              f"| marca {MARCA_REABASTECER} | {GERACOES_POR_MINUTO} gerações/min")
+
+    async def parar(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _loop(self, n):
+        while True:
+            chave = await self._fila.get()
+            try:
+                await self._reabastecer(*chave)
+            except Exception as e:
+                print(f"   ❌ [pool {n}] Erro ao reabastecer {chave}: {e}")
+            finally:
+                self._ultima_verificacao[chave] = time.monotonic()
+                self._pendentes.discard(chave)
+                self._fila.task_done()
+
+    async def _reabastecer(self, ilha_id, dificuldade):
+        db = await get_supabase_async()
+        resp = await db.rpc("contar_estoque_questoes", {
+            "p_lesson_id": ilha_id,
+            "p_dificuldade": dificuldade,
+            "p_max_usuarios": MAX_RESPONDENTES
+        }).execute()
+        estoque = resp.data or 0
+
+        if estoque >= MARCA_REABASTECER:
+            return
+
+        faltam = ESTOQUE_MINIMO - estoque
+        print(f"🏭 Reabastecendo Ilha {ilha_id} ({dificuldade}): estoque {estoque} → {ESTOQUE_MINIMO}")
+
+        for _ in range(MAX_RODADAS):
+            if faltam <= 0:
+                break
+            await self.limitador.adquirir()
+            novas = await gerar_questoes_ia(self.modelo, ilha_id, min(LOTE_GERACAO, faltam), dificuldade)
+            if not novas:
+                break
+            salvas = await salvar_questoes(db, novas)
+            if not salvas:
+                # Tudo inválido ou clone (deduplicador): insistir só gasta cota nessa ilha
+                print(f"   ⚠️ Nenhuma questão nova aproveitada na Ilha {ilha_id} ({dificuldade}); parando por agora.")
+                break
+            faltam -= len(salvas)
+
+        print(f"   ✅ Pool da Ilha {ilha_id} ({dificuldade}) reabastecido.")
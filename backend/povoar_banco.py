@@ -1,9 +1,15 @@
 import os
 import json
+import random
+import argparse
 import asyncio
 from dotenv import load_dotenv
 import google.generativeai as genai
-from database import supabase
+from google.api_core.exceptions import ResourceExhausted
+from database import supabase, buscar_tudo, rodar_em_thread
+from limitador import LimitadorTaxa
+from repositorio_questoes import inserir_questoes_em_lote
+from deduplicador import inserir_sem_clones
 
 # Carrega chaves
 load_dotenv()
@@ -15,7 +21,37 @@ model = genai.GenerativeModel(
     generation_config={"response_mime_type": "application/json"}
 )
 
-async def gerar_questoes_para_ilha(ilha_id, titulo_ilha):
+# Configuração do pipeline (também aceita flags na linha de comando)
+WORKERS = int(os.getenv("POVOAR_WORKERS", "4"))
+REQUISICOES_POR_MINUTO = int(os.getenv("GEMINI_RPM", "10"))  # Ajuste à cota da sua chave
+MAX_TENTATIVAS = 5
+ARQUIVO_CHECKPOINT = os.getenv("POVOAR_CHECKPOINT", "povoar_checkpoint.json")
+
+
+def _eh_limite_de_taxa(e):
+    return isinstance(e, ResourceExhausted) or "429" in str(e)
+
+
+class Checkpoint:
+    """Arquivo JSON com as ilhas já povoadas. Permite parar e retomar sem repetir."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.feitas = set()
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                self.feitas = set(json.load(f))
+
+    def marcar(self, ilha_id):
+        self.feitas.add(ilha_id)
+        # Grava num temporário e troca: um Ctrl+C no meio não corrompe o arquivo
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(sorted(self.feitas), f)
+        os.replace(temporario, self.caminho)
+
+
+async def gerar_questoes_para_ilha(ilha_id, titulo_ilha, limitador):
     print(f"🤖 Gerando questões para: {titulo_ilha}...")
 
     prompt = f"""
@@ -42,53 +78,86 @@ async def gerar_questoes_para_ilha(ilha_id, titulo_ilha):
     ]
     """
 
-    try:
-        # Pede para a IA
-        response = model.generate_content(prompt)
-        questoes = json.loads(response.text) # Transforma texto em objeto Python
-
-        # Salva cada questão no Supabase
-        count = 0
-        for q in questoes:
-            # Adiciona o ID da ilha (Foreign Key)
-            q['lesson_id'] = ilha_id
-            
-            # Insere no banco
-            supabase.table("questions").insert(q).execute()
-            count += 1
-            
-        print(f"   ✅ {count} questões salvas para '{titulo_ilha}'.")
-
-    except Exception as e:
-        print(f"   ❌ Erro ao gerar para '{titulo_ilha}': {e}")
+    # Pede para a IA (respeitando a cota e tentando de novo em caso de 429)
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        await limitador.adquirir()
+        try:
+            response = await model.generate_content_async(prompt)
+            break
+        except Exception as e:
+            if not _eh_limite_de_taxa(e) or tentativa == MAX_TENTATIVAS:
+                raise
+            espera = min(300, 5 * 2 ** tentativa) + random.uniform(0, 3)
+            print(f"   ⏳ 429 em '{titulo_ilha}' (tentativa {tentativa}). Aguardando {espera:.0f}s...")
+            await asyncio.sleep(espera)
+
+    questoes = json.loads(response.text) # Transforma texto em objeto Python
+
+    # Adiciona o ID da ilha (Foreign Key) em todas
+    for q in questoes:
+        q['lesson_id'] = ilha_id
+
+    # Descarta clones (embeddings + cosseno) e salva o resto em um único request (fora do event loop)
+    async def inserir(aceitas):
+        return await rodar_em_thread(inserir_questoes_em_lote, aceitas)
+    salvas = await inserir_sem_clones(questoes, inserir)
+    print(f"   ✅ {len(salvas)} questões salvas para '{titulo_ilha}'.")
+    return len(salvas)
+
+async def worker(nome, fila, limitador, checkpoint, resumo):
+    while True:
+        ilha = await fila.get()
+        try:
+            if await gerar_questoes_para_ilha(ilha['id'], ilha['titulo'], limitador):
+                checkpoint.marcar(ilha['id'])
+                resumo['ok'] += 1
+        except Exception as e:
+            print(f"   ❌ [{nome}] Erro ao gerar para '{ilha['titulo']}': {e}")
+            resumo['falhas'] += 1
+        finally:
+            fila.task_done()
 
 async def main():
+    parser = argparse.ArgumentParser(description="Povoa as ilhas vazias com questões geradas pela IA.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--por-minuto", type=int, default=REQUISICOES_POR_MINUTO, help="Chamadas ao Gemini por minuto")
+    parser.add_argument("--checkpoint", default=ARQUIVO_CHECKPOINT)
+    args = parser.parse_args()
+
     print("📚 Iniciando o Bibliotecário Automático...")
 
     # 1. Buscar todas as ilhas existentes no banco
-    response = supabase.table("lessons").select("id, titulo").execute()
-    ilhas = response.data
+    ilhas = buscar_tudo("lessons", "id, titulo")
 
     if not ilhas:
         print("⚠️ Nenhuma ilha encontrada! Rode o setup_inicial.py primeiro.")
         return
 
-    print(f"📍 Encontrei {len(ilhas)} ilhas para processar.")
+    # 2. UMA consulta para saber quais ilhas já têm questões (para não gastar API à toa)
+    com_questoes = set(supabase.rpc("licoes_com_questoes").execute().data or [])
+    checkpoint = Checkpoint(args.checkpoint)
+    pendentes = [i for i in ilhas if i['id'] not in com_questoes and i['id'] not in checkpoint.feitas]
+
+    print(f"📍 {len(ilhas)} ilhas | {len(com_questoes)} já com questões | "
+          f"{len(checkpoint.feitas)} no checkpoint | {len(pendentes)} para processar.")
+    print(f"⚙️ {args.workers} workers | {args.por_minuto} chamadas/min")
+
+    # 3. Pipeline concorrente: fila + workers + limitador global
+    limitador = LimitadorTaxa(args.por_minuto)
+    fila = asyncio.Queue()
+    for ilha in pendentes:
+        fila.put_nowait(ilha)
 
-    # 2. Loop para gerar questões para cada ilha
-    for ilha in ilhas:
-        # Verifica se a ilha já tem questões (para não gastar API à toa)
-        check = supabase.table("questions").select("id").eq("lesson_id", ilha['id']).execute()
-        
-        if len(check.data) > 0:
-            print(f"⏭️  Pular '{ilha['titulo']}': Já possui questões.")
-        else:
-            # Se estiver vazia, chama a IA
-            await gerar_questoes_para_ilha(ilha['id'], ilha['titulo'])
-            # Pequena pausa para não estourar o limite da API gratuita
-            await asyncio.sleep(30) 
+    resumo = {'ok': 0, 'falhas': 0}
+    workers = [asyncio.create_task(worker(f"w{n}", fila, limitador, checkpoint, resumo)) for n in range(args.workers)]
+    await fila.join()
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
 
-    print("\n🎉 Processo finalizado! Seu banco de dados está povoado.")
+    print(f"\n🎉 Processo finalizado! {resumo['ok']} ilhas povoadas, {resumo['falhas']} falhas.")
+    if resumo['falhas']:
+        print("   Rode de novo para tentar as que falharam (as concluídas estão no checkpoint).")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
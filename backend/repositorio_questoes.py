@@ -0,0 +1,134 @@
+from database import supabase
+
+# ==============================================================================
+# 💾 ESCRITA EM LOTE NA TABELA questions
+# ==============================================================================
+# Um único ponto de escrita para a IA (main.py / povoar_banco.py) e para a
+# importação manual: valida, normaliza e insere em requests multi-linha.
+# 10 questões = 1 round trip, não 10.
+# ==============================================================================
+
+TAMANHO_LOTE = 500
+LETRAS_VALIDAS = {"A", "B", "C", "D"}
+DIFICULDADES_VALIDAS = {"Fácil", "Médio", "Difícil"}
+CAMPOS_TEXTO = ["enunciado", "alternativa_a", "alternativa_b", "alternativa_c", "alternativa_d", "explicacao"]
+COLUNAS = ["lesson_id", *CAMPOS_TEXTO, "correta", "dificuldade"]
+
+
+def preparar_questao(q):
+    """Normaliza um dict (IA, arquivo, etc.) para as colunas da tabela questions."""
+    nova = {col: q.get(col) for col in COLUNAS}
+    for campo in CAMPOS_TEXTO:
+        if isinstance(nova[campo], str):
+            nova[campo] = nova[campo].strip()
+    if isinstance(nova["correta"], str):
+        nova["correta"] = nova["correta"].strip().upper() # Garante que seja 'A' e não 'a'
+    if isinstance(nova["dificuldade"], str):
+        nova["dificuldade"] = nova["dificuldade"].strip()
+    return nova
+
+
+def validar_questao(q, exigir_licao=True):
+    """Retorna a lista de problemas da questão (vazia = válida)."""
+    erros = []
+    if exigir_licao and not q.get("lesson_id"):
+        erros.append("lesson_id ausente")
+    for campo in CAMPOS_TEXTO:
+        if not q.get(campo):
+            erros.append(f"'{campo}' vazio")
+    if q.get("correta") not in LETRAS_VALIDAS:
+        erros.append(f"correta inválida: {q.get('correta')!r} (use A, B, C ou D)")
+    if q.get("dificuldade") not in DIFICULDADES_VALIDAS:
+        erros.append(f"dificuldade inválida: {q.get('dificuldade')!r}")
+    return erros
+
+
+def separar_validas(questoes):
+    """Prepara tudo e separa em (validas, rejeitadas). rejeitadas = [(questao, erros)]."""
+    validas, rejeitadas = [], []
+    for q in questoes:
+        nova = preparar_questao(q)
+        erros = validar_questao(nova)
+        if erros:
+            rejeitadas.append((q, erros))
+        else:
+            validas.append(nova)
+    return validas, rejeitadas
+
+
+def _lotes(itens, tamanho):
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+def _avisar_rejeitadas(rejeitadas):
+    for q, erros in rejeitadas:
+        print(f"   ⚠️ Questão descartada ({'; '.join(erros)}): {str(q.get('enunciado', ''))[:60]}...")
+
+
+def inserir_questoes_em_lote(questoes, tamanho_lote=TAMANHO_LOTE, cliente=None):
+    """
+    Valida e insere as questões em requests multi-linha.
+    Retorna as linhas criadas (com id). Questões inválidas são descartadas com aviso.
+    """
+    cliente = cliente or supabase
+    validas, rejeitadas = separar_validas(questoes)
+    _avisar_rejeitadas(rejeitadas)
+
+    criadas = []
+    for lote in _lotes(validas, tamanho_lote):
+        res = cliente.table("questions").insert(lote).execute()
+        criadas.extend(res.data)
+    return criadas
+
+
+async def inserir_questoes_em_lote_async(db, questoes, tamanho_lote=TAMANHO_LOTE):
+    """Mesma coisa, usando o cliente assíncrono das rotas do FastAPI."""
+    validas, rejeitadas = separar_validas(questoes)
+    _avisar_rejeitadas(rejeitadas)
+
+    criadas = []
+    for lote in _lotes(validas, tamanho_lote):
+        res = await db.table("questions").insert(lote).execute()
+        criadas.extend(res.data)
+    return criadas
+
+
+# --- Ponte com o question_bank (banco vetorial) ---
+DIFICULDADE_BANCO = {"Fácil": "easy", "Médio": "medium", "Difícil": "hard"}
+
+
+def de_question_bank(item, lesson_id, dificuldade):
+    """
+    Converte um item do question_bank (options jsonb) para as colunas de questions.
+    Retorna None se não couber no formato A-D (outros tipos, nº de opções diferente).
+    """
+    opcoes = item.get("options") or []
+    if item.get("q_type") != "multiple_choice" or len(opcoes) != 4:
+        return None
+    nova = {
+        "lesson_id": lesson_id,
+        "enunciado": item.get("statement"),
+        "explicacao": item.get("commentary"),
+        "dificuldade": dificuldade,
+    }
+    for letra, opcao in zip("ABCD", opcoes):
+        nova[f"alternativa_{letra.lower()}"] = opcao.get("text")
+        if opcao.get("isCorrect"):
+            nova["correta"] = letra
+    nova = preparar_questao(nova)
+    return None if validar_questao(nova) else nova
+
+
+def para_question_bank(q, tema):
+    """Linha de questions -> item do question_bank (mesmo formato de options do frontend)."""
+    return {
+        "statement": q["enunciado"],
+        "options": [{"id": l, "text": q[f"alternativa_{l.lower()}"], "isCorrect": q["correta"] == l} for l in "ABCD"],
+        "correct_answer": q["correta"],
+        "commentary": q.get("explicacao"),
+        "q_type": "multiple_choice",
+        "topics": [tema],
+        "difficulty": DIFICULDADE_BANCO.get(q.get("dificuldade"), "medium"),
+        "source": "legacy_quiz",
+    }
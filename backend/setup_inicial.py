@@ -1,5 +1,7 @@
-import asyncio
-from database import supabase
+import argparse
+from database import supabase, buscar_tudo
+
+TAMANHO_LOTE = 500
 
 # ==============================================================================
 # 📚 O CURRÍCULO MÉDICO (Aqui você define a estrutura do seu App)
@@ -995,72 +997,99 @@ CURRICULO_MEDICINA = [
 # ==============================================================================
 # 🏗️ O CONSTRUTOR (A Lógica que monta o banco)
 # ==============================================================================
-def construir_curriculo():
+def _inserir_nivel(tabela, linhas, dry_run):
+    """
+    Insere todas as linhas novas de um nível em um único request e devolve as
+    linhas criadas (com id). No dry-run nada é escrito: os ids são marcadores.
+    """
+    if not linhas:
+        return []
+    if dry_run:
+        return [{**linha, "id": f"<novo {tabela} #{n}>"} for n, linha in enumerate(linhas, 1)]
+    criadas = []
+    for i in range(0, len(linhas), TAMANHO_LOTE):
+        criadas.extend(supabase.table(tabela).insert(linhas[i:i + TAMANHO_LOTE]).execute().data)
+    return criadas
+
+def construir_curriculo(dry_run=False):
+    """
+    Bootstrap em modo diff-and-apply:
+    1. Lê cada tabela da hierarquia UMA vez.
+    2. Calcula em memória o que falta.
+    3. Insere em lote, nível por nível (áreas → sistemas → trilhas → ilhas).
+    Rodar de novo num banco já povoado = 4 leituras e nenhuma escrita.
+    """
     print("🏥 Iniciando a construção do Hospital Virtual (MediLingo)...")
+    if dry_run:
+        print("🔍 DRY-RUN: nada será gravado, apenas o diff será exibido.")
+
+    # 1. Estado atual do banco (uma leitura por tabela)
+    areas_db = {a['nome']: a['id'] for a in buscar_tudo("areas", "id, nome")}
+    # Sistemas são identificados só pelo nome (mesma regra de antes)
+    sistemas_db = {s['nome']: s['id'] for s in buscar_tudo("systems", "id, nome")}
+    # (Aqui usamos system_id também, pois "Anatomia" existe em Cardio e Neuro)
+    trilhas_db = {(m['nome'], m['system_id']): m['id'] for m in buscar_tudo("modules", "id, nome, system_id")}
+    ilhas_db = {(l['titulo'], l['module_id']) for l in buscar_tudo("lessons", "titulo, module_id")}
 
+    # 2. Áreas
+    novas = [{"nome": a['area']} for a in CURRICULO_MEDICINA if a['area'] not in areas_db]
+    for criada in _inserir_nivel("areas", novas, dry_run):
+        areas_db[criada['nome']] = criada['id']
+    print(f"📍 Áreas: {len(novas)} novas")
+    for a in novas: print(f"    + {a['nome']}")
+
+    # 3. Sistemas
+    novos, vistos = [], set()
     for area_data in CURRICULO_MEDICINA:
-        # 1. Cria/Pega a Grande Área (Ex: Fisiológico)
-        print(f"\n📍 Processando Área: {area_data['area']}...")
-        res_area = supabase.table("areas").select("id").eq("nome", area_data['area']).execute()
-        
-        if res_area.data:
-            area_id = res_area.data[0]['id']
-        else:
-            # Se não existe, cria
-            novo = supabase.table("areas").insert({"nome": area_data['area']}).execute()
-            area_id = novo.data[0]['id']
+        for sistema_data in area_data['sistemas']:
+            nome = sistema_data['nome']
+            if nome not in sistemas_db and nome not in vistos:
+                vistos.add(nome)
+                novos.append({"nome": nome, "area_id": areas_db[area_data['area']]})
+    for criado in _inserir_nivel("systems", novos, dry_run):
+        sistemas_db[criado['nome']] = criado['id']
+    print(f"  🧠 Sistemas: {len(novos)} novos")
+    for sis in novos: print(f"    + {sis['nome']}")
 
-        # 2. Loop nos Sistemas
+    # 4. Trilhas (a ordem é a posição na lista do sistema)
+    novas, vistas = [], set()
+    for area_data in CURRICULO_MEDICINA:
         for sistema_data in area_data['sistemas']:
-            print(f"  🧠 Sistema: {sistema_data['nome']}")
-            
-            # Busca ID do sistema ou cria
-            res_sis = supabase.table("systems").select("id").eq("nome", sistema_data['nome']).execute()
-            if res_sis.data:
-                sis_id = res_sis.data[0]['id']
-            else:
-                novo = supabase.table("systems").insert({"nome": sistema_data['nome'], "area_id": area_id}).execute()
-                sis_id = novo.data[0]['id']
+            sis_id = sistemas_db[sistema_data['nome']]
+            for ordem_trilha, trilha_data in enumerate(sistema_data['trilhas'], 1):
+                chave = (trilha_data['nome'], sis_id)
+                if chave not in trilhas_db and chave not in vistas:
+                    vistas.add(chave)
+                    novas.append({"nome": trilha_data['nome'], "system_id": sis_id, "ordem": ordem_trilha})
+    for criada in _inserir_nivel("modules", novas, dry_run):
+        trilhas_db[(criada['nome'], criada['system_id'])] = criada['id']
+    print(f"  🛤️ Trilhas: {len(novas)} novas")
+    for t in novas: print(f"    + {t['nome']} (sistema {t['system_id']})")
 
-            # 3. Loop nas Trilhas (Subseções)
-            ordem_trilha = 1
+    # 5. Ilhas (posicao_x é a posição na lista da trilha)
+    novas, vistas = [], set()
+    for area_data in CURRICULO_MEDICINA:
+        for sistema_data in area_data['sistemas']:
+            sis_id = sistemas_db[sistema_data['nome']]
             for trilha_data in sistema_data['trilhas']:
-                nome_trilha = trilha_data['nome'] # Ex: Semiologia
-                
-                # Busca ID da trilha ou cria
-                # (Aqui filtramos por system_id também, pois "Anatomia" existe em Cardio e Neuro)
-                res_mod = supabase.table("modules").select("id").match({"nome": nome_trilha, "system_id": sis_id}).execute()
-                
-                if res_mod.data:
-                    mod_id = res_mod.data[0]['id']
-                else:
-                    novo = supabase.table("modules").insert({
-                        "nome": nome_trilha, 
-                        "system_id": sis_id, 
-                        "ordem": ordem_trilha
-                    }).execute()
-                    mod_id = novo.data[0]['id']
-                
-                ordem_trilha += 1
-
-                # 4. Loop nas Ilhas (Lições)
-                pos_x = 1
-                for ilha_nome in trilha_data['ilhas']:
-                    # Verifica se a ilha já existe nesse módulo
-                    res_lesson = supabase.table("lessons").select("id").match({"titulo": ilha_nome, "module_id": mod_id}).execute()
-                    
-                    if not res_lesson.data:
-                        supabase.table("lessons").insert({
-                            "titulo": ilha_nome,
-                            "module_id": mod_id,
-                            "posicao_x": pos_x,
-                            "posicao_y": 1 
-                        }).execute()
-                        print(f"    ➡️ Ilha criada: {ilha_nome}")
-                    
-                    pos_x += 1
+                mod_id = trilhas_db[(trilha_data['nome'], sis_id)]
+                for pos_x, ilha_nome in enumerate(trilha_data['ilhas'], 1):
+                    chave = (ilha_nome, mod_id)
+                    if chave not in ilhas_db and chave not in vistas:
+                        vistas.add(chave)
+                        novas.append({"titulo": ilha_nome, "module_id": mod_id, "posicao_x": pos_x, "posicao_y": 1})
+    _inserir_nivel("lessons", novas, dry_run)
+    print(f"    ➡️ Ilhas: {len(novas)} novas")
+    for i in novas: print(f"    + {i['titulo']} (trilha {i['module_id']})")
 
-    print("\n✅ Construção finalizada com sucesso! Verifique o Supabase.")
+    if dry_run:
+        print("\n🔍 DRY-RUN finalizado. Rode sem --dry-run para aplicar.")
+    else:
+        print("\n✅ Construção finalizada com sucesso! Verifique o Supabase.")
+        print("   Dica: chame POST /cache/curriculo/invalidar para a API enxergar as mudanças.")
 
 if __name__ == "__main__":
-    construir_curriculo()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cria/atualiza a hierarquia do currículo no Supabase.")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o diff, sem gravar nada")
+    args = parser.parse_args()
+    construir_curriculo(dry_run=args.dry_run)
@@ -0,0 +1,69 @@
+import asyncio
+
+# ==============================================================================
+# ✈️ SINGLE-FLIGHT: uma geração por chave, vários esperando o mesmo resultado
+# ==============================================================================
+# Se 20 alunos abrem a mesma ilha ao mesmo tempo (aula), só o primeiro dispara o
+# Gemini; os outros aguardam a mesma tarefa e recebem a mesma saída.
+# ==============================================================================
+
+_FIM = object()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._em_voo = {}
+
+    async def executar(self, chave, fabrica):
+        """
+        Roda `fabrica()` (corrotina) uma única vez por chave enquanto estiver em voo.
+        Retorna (resultado, lider): lider=False quando aproveitou a tarefa de outro.
+        """
+        tarefa = self._em_voo.get(chave)
+        lider = tarefa is None
+        if lider:
+            tarefa = asyncio.ensure_future(fabrica())
+            self._em_voo[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_voo.pop(chave, None))
+
+        # shield: se um cliente desconectar, a geração continua para os demais
+        return await asyncio.shield(tarefa), lider
+
+    async def executar_em_stream(self, chave, fabrica):
+        """
+        Como executar, para gerações em stream: `fabrica()` devolve um gerador
+        assíncrono. O líder recebe cada item assim que sai; quem chega com a
+        mesma chave em voo (em stream ou não) recebe a lista completa no final.
+        O gerador roda numa tarefa própria: se o líder desconectar, ele vai até
+        o fim para os demais. Gera pares (item, lider).
+        """
+        tarefa = self._em_voo.get(chave)
+        if tarefa is not None:
+            for item in await asyncio.shield(tarefa):
+                yield item, False
+            return
+
+        fila = asyncio.Queue()
+
+        async def consumir():
+            itens = []
+            try:
+                async for item in fabrica():
+                    itens.append(item)
+                    fila.put_nowait(item)
+            finally:
+                fila.put_nowait(_FIM)
+            return itens
+
+        tarefa = asyncio.ensure_future(consumir())
+        self._em_voo[chave] = tarefa
+        tarefa.add_done_callback(lambda _: self._em_voo.pop(chave, None))
+        while True:
+            item = await fila.get()
+            if item is _FIM:
+                break
+            yield item, True
+        await tarefa  # Propaga o erro da geração (depois de entregar o que saiu)
+
+    def em_voo(self):
+        return len(self._em_voo)
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+import httpx
+
+# ==============================================================================
+# 🔥 TESTE DE CARGA: latência do /areas enquanto a IA gera questões
+# ==============================================================================
+# Dispara N sessões que forçam geração pela IA (quantidade alta) e, ao mesmo
+# tempo, martela o /areas. Se o event loop estiver livre, o p99 do /areas fica
+# em milissegundos mesmo com o Gemini "pensando".
+#
+# Uso (com o servidor rodando):
+#   CARGA_USER_ID=<uuid> python teste_carga.py <ilha_id> [sessoes_simultaneas]
+# ==============================================================================
+
+BASE_URL = os.getenv("CARGA_BASE_URL", "http://localhost:8000")
+QUANTIDADE_FORCADA = 20  # Pede mais questões do que existe no estoque para acionar a IA
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+async def sessao_com_ia(cliente, ilha_id, user_id, tempos):
+    inicio = time.perf_counter()
+    await cliente.get(f"/praticar/session/{ilha_id}",
+                      params={"user_id": user_id, "dificuldade": "Difícil", "quantidade": QUANTIDADE_FORCADA})
+    tempos.append((time.perf_counter() - inicio) * 1000)
+
+
+async def martelar_areas(cliente, parar, tempos):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await cliente.get("/areas")
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def main():
+    user_id = os.getenv("CARGA_USER_ID")
+    if not user_id or len(sys.argv) < 2:
+        print("Uso: CARGA_USER_ID=<uuid> python teste_carga.py <ilha_id> [sessoes_simultaneas]")
+        return
+
+    ilha_id = int(sys.argv[1])
+    n_sessoes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    tempos_areas, tempos_sessao = [], []
+    parar = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120) as cliente:
+        await cliente.get("/areas")  # Aquece o cache
+        print(f"🔥 {n_sessoes} sessões com IA em paralelo + /areas em loop...")
+
+        martelo = asyncio.create_task(martelar_areas(cliente, parar, tempos_areas))
+        await asyncio.gather(*(sessao_com_ia(cliente, ilha_id, user_id, tempos_sessao) for _ in range(n_sessoes)))
+        parar.set()
+        await martelo
+
+    print(f"\n📊 /areas ({len(tempos_areas)} requests durante a geração)")
+    print(f"   p50: {statistics.median(tempos_areas):.1f} ms")
+    print(f"   p99: {percentil(tempos_areas, 99):.1f} ms")
+    print(f"   máx: {max(tempos_areas):.1f} ms")
+    print(f"\n🤖 Sessões com IA: p50 {statistics.median(tempos_sessao):.0f} ms | máx {max(tempos_sessao):.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
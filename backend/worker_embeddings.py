@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+import google.generativeai as genai
+from database import get_supabase_async
+from embeddings import gerar_embedding, gerar_embeddings_lote
+from limitador import LimitadorTaxa
+
+# ==============================================================================
+# 🧭 WORKER DE EMBEDDINGS (question_bank com embedding_status != 'completed')
+# ==============================================================================
+# Cada worker repete: reserva um lote (RPC reservar_embeddings_pendentes, com
+# FOR UPDATE SKIP LOCKED + lease) -> uma chamada de batch à API de embeddings
+# -> grava todos os vetores num único UPDATE (RPC gravar_embeddings).
+#
+# Se o batch falhar, as linhas são vetorizadas uma a uma para isolar a
+# culpada; só as que falharem de novo viram 'failed' e voltam à fila com
+# backoff exponencial (até EMBEDDINGS_MAX_TENTATIVAS).
+#
+# Ver database/create_embedding_worker.sql.
+# Uso: python worker_embeddings.py [--lote 100] [--workers 2] [--continuo]
+#   (ou no servidor, com EMBEDDINGS_WORKER_ATIVO=1)
+# ==============================================================================
+
+TAMANHO_LOTE = int(os.getenv("EMBEDDINGS_TAMANHO_LOTE", "100"))
+NUM_WORKERS = int(os.getenv("EMBEDDINGS_WORKERS", "2"))
+LOTES_POR_MINUTO = int(os.getenv("EMBEDDINGS_LOTES_POR_MINUTO", "60"))
+MAX_TENTATIVAS = int(os.getenv("EMBEDDINGS_MAX_TENTATIVAS", "5"))
+LEASE_SEGUNDOS = int(os.getenv("EMBEDDINGS_LEASE_SEGUNDOS", "300"))
+BACKOFF_SEGUNDOS = int(os.getenv("EMBEDDINGS_BACKOFF_SEGUNDOS", "60"))
+INTERVALO_OCIOSO = float(os.getenv("EMBEDDINGS_INTERVALO_OCIOSO", "30"))  # segundos sem nada na fila
+
+
+class WorkerEmbeddings:
+    def __init__(self, tamanho_lote=TAMANHO_LOTE, num_workers=NUM_WORKERS, continuo=True):
+        self.tamanho_lote = tamanho_lote
+        self.num_workers = num_workers
+        self.continuo = continuo
+        self.limitador = LimitadorTaxa(LOTES_POR_MINUTO)
+        self._workers = []
+        self._inicio = None
+        self.metricas = {"vetorizadas": 0, "falhas": 0, "lotes": 0}
+
+    async def iniciar(self):
+        self._inicio = time.monotonic()
+        self._workers = [asyncio.create_task(self._loop(i)) for i in range(self.num_workers)]
+        print(f"🧭 Worker de embeddings ativo: {self.num_workers} workers | lotes de {self.tamanho_lote} "
+              f"| {LOTES_POR_MINUTO} lotes/min")
+
+    async def parar(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def esperar(self):
+        """Modo script: espera os workers esvaziarem a fila."""
+        await asyncio.gather(*self._workers)
+
+    async def _loop(self, n):
+        while True:
+            try:
+                processadas = await self._processar_lote()
+            except Exception as e:
+                print(f"   ❌ [embeddings {n}] Erro no lote: {e}")
+                processadas = 0
+            if processadas:
+                continue
+            if not self.continuo:
+                return
+            await asyncio.sleep(INTERVALO_OCIOSO)
+
+    async def _processar_lote(self):
+        db = await get_supabase_async()
+        resp = await db.rpc("reservar_embeddings_pendentes", {
+            "p_limite": self.tamanho_lote,
+            "p_lease_segundos": LEASE_SEGUNDOS,
+            "p_max_tentativas": MAX_TENTATIVAS,
+        }).execute()
+        linhas = resp.data or []
+        if not linhas:
+            return 0
+
+        inicio = time.monotonic()
+        await self.limitador.adquirir()
+        try:
+            vetores = await gerar_embeddings_lote([l["statement"] for l in linhas])
+            ok, falhas = list(zip(linhas, vetores)), []
+        except Exception as e:
+            print(f"   ⚠️ Batch de {len(linhas)} falhou ({e}); vetorizando uma a uma...")
+            ok, falhas = await self._individualmente(linhas)
+
+        if ok:
+            await db.rpc("gravar_embeddings", {
+                "p_itens": [{"id": l["id"], "embedding": v} for l, v in ok]
+            }).execute()
+        for erro, ids in _agrupar_falhas(falhas).items():
+            await db.rpc("marcar_embeddings_falhos", {
+                "p_ids": ids,
+                "p_erro": erro,
+                "p_backoff_segundos": BACKOFF_SEGUNDOS,
+            }).execute()
+
+        self.metricas["lotes"] += 1
+        self.metricas["vetorizadas"] += len(ok)
+        self.metricas["falhas"] += len(falhas)
+        duracao = max(time.monotonic() - inicio, 1e-6)
+        print(f"   ✅ Lote: {len(ok)} vetorizadas | {len(falhas)} falhas | "
+              f"{len(linhas) / duracao:.1f} linhas/s (média {self.linhas_por_segundo():.1f} linhas/s)")
+        return len(linhas)
+
+    async def _individualmente(self, linhas):
+        ok, falhas = [], []
+        for l in linhas:
+            try:
+                ok.append((l, await gerar_embedding(l["statement"])))
+            except Exception as e:
+                falhas.append((l, str(e)))
+        return ok, falhas
+
+    def linhas_por_segundo(self):
+        if not self._inicio:
+            return 0.0
+        total = self.metricas["vetorizadas"] + self.metricas["falhas"]
+        return total / max(time.monotonic() - self._inicio, 1e-6)
+
+    def snapshot_metricas(self):
+        return {**self.metricas, "linhas_por_segundo": round(self.linhas_por_segundo(), 2)}
+
+
+def _agrupar_falhas(falhas):
+    """Uma chamada de marcar_embeddings_falhos por mensagem de erro."""
+    por_erro = {}
+    for linha, erro in falhas:
+        por_erro.setdefault(erro, []).append(linha["id"])
+    return por_erro
+
+
+async def rodar(args):
+    worker = WorkerEmbeddings(args.lote, args.workers, continuo=args.continuo)
+    await worker.iniciar()
+    try:
+        await worker.esperar()
+    finally:
+        await worker.parar()
+    m = worker.snapshot_metricas()
+    print(f"\n🎉 Fila de embeddings processada: {m['vetorizadas']} vetorizadas | {m['falhas']} falhas "
+          f"| {m['linhas_por_segundo']} linhas/s")
+
+
+def main():
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    parser = argparse.ArgumentParser(description="Vetoriza as linhas pendentes do question_bank.")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--continuo", action="store_true", help="Não para quando a fila esvazia")
+    asyncio.run(rodar(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+-- ==============================================================================
+-- PONTE questions <-> question_bank (busca vetorial no /praticar/semelhante)
+-- Data: 2026-10-17
+-- Descrição: Liga cada questão do quiz ao seu item vetorizado no question_bank
+--            (mesmo papel do track_questions.original_question_id). Um acerto
+--            do match_questions vira a questão do quiz já ligada a ele, sem
+--            gerar um clone novo pela IA.
+-- ==============================================================================
+
+ALTER TABLE public.questions
+ADD COLUMN IF NOT EXISTS question_bank_id UUID REFERENCES public.question_bank(id) ON DELETE SET NULL;
+
+-- Uma ponte por item do banco: dois /praticar/semelhante simultâneos no mesmo
+-- vizinho não criam duas questões. Índice único sem predicado (NULLs não
+-- conflitam entre si) para o upsert do PostgREST (on_conflict) conseguir usá-lo.
+DROP INDEX IF EXISTS public.idx_questions_question_bank_id;
+
+-- Pontes duplicadas criadas antes do índice: fica a mais antiga
+UPDATE public.questions q
+SET question_bank_id = NULL
+WHERE q.question_bank_id IS NOT NULL
+  AND EXISTS (
+    SELECT 1 FROM public.questions o
+    WHERE o.question_bank_id = q.question_bank_id AND o.id < q.id
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_question_bank_id_unico
+ON public.questions(question_bank_id);
+
+COMMENT ON COLUMN public.questions.question_bank_id IS 'Item do question_bank (com embedding) equivalente a esta questão. Preenchido pelo backend no /praticar/semelhante.';
@@ -0,0 +1,20 @@
+-- ==============================================================================
+-- HISTÓRICO: Chave de idempotência das tentativas (write-behind do /historico)
+-- Data: 2026-10-17
+-- Descrição: O backend/buffer_historico.py dá uma chave a cada tentativa antes
+--            do ack e grava os lotes com ON CONFLICT (idempotency_key) DO
+--            NOTHING. Um lote reenviado (spool depois de uma queda, flush que
+--            falhou no meio) não duplica a linha, e os triggers AFTER INSERT de
+--            user_history (stats, estado, SM-2, habilidade, rollup diário) não
+--            contam a mesma tentativa duas vezes.
+--            Gravações diretas ficam com NULL (NULLs não conflitam entre si).
+-- ==============================================================================
+
+ALTER TABLE public.user_history
+ADD COLUMN IF NOT EXISTS idempotency_key UUID;
+
+-- Índice único sem predicado para o upsert do PostgREST (on_conflict) conseguir usá-lo
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_history_idempotency_key
+ON public.user_history(idempotency_key);
+
+COMMENT ON COLUMN public.user_history.idempotency_key IS 'Chave do cliente para reenvios idempotentes (write-behind do backend). NULL em gravações diretas.';
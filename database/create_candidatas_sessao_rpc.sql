@@ -0,0 +1,137 @@
+-- ==============================================================================
+-- SESSÃO DE TREINO: Candidatas da ilha para o motor de seleção
+-- Data: 2026-10-17
+-- Descrição: Devolve TODAS as questões da ilha em formato colunar (um array
+--            por atributo), pronto para virar arrays NumPy no
+--            backend/motor_selecao.py:
+--              ids, dificuldades, tentativas/acertos globais e, para o aluno,
+--              o último resultado e há quantos dias viu a questão.
+--            Também devolve o θ do aluno na ilha (user_lesson_ability), usado
+--            pelo modo adaptativo sem uma leitura a mais.
+--            Um único JSONB (não SETOF) para não esbarrar no limite de 1000
+--            linhas do PostgREST em ilhas grandes.
+--            Tentativas/acertos globais vêm de question_stats, mantida por
+--            trigger a cada INSERT em user_history: o custo da RPC depende
+--            só do número de questões da ilha, não de quantos alunos a fizeram.
+--            Depende de database/create_user_question_state.sql e
+--            database/create_user_lesson_ability.sql.
+-- ==============================================================================
+
+-- 1. Contadores globais por questão (mesmos nomes do question_bank), numa
+--    tabela estreita: a linha larga de questions não vira ponto de lock
+CREATE TABLE IF NOT EXISTS public.question_stats (
+  question_id BIGINT PRIMARY KEY REFERENCES public.questions(id) ON DELETE CASCADE,
+  stats_attempts INTEGER NOT NULL DEFAULT 0,
+  stats_correct INTEGER NOT NULL DEFAULT 0
+);
+
+ALTER TABLE public.question_stats ENABLE ROW LEVEL SECURITY;
+
+-- Trigger por comando: um lote do write-behind vira um único upsert agregado,
+-- travando as linhas sempre na ordem de question_id (lotes concorrentes não
+-- entram em deadlock)
+CREATE OR REPLACE FUNCTION public.incrementar_stats_questao()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO public.question_stats AS s (question_id, stats_attempts, stats_correct)
+  SELECT n.question_id,
+         count(*)::int,
+         count(*) FILTER (WHERE n.is_correct)::int
+  FROM novas n
+  JOIN public.questions q ON q.id = n.question_id
+  GROUP BY n.question_id
+  ORDER BY n.question_id
+  ON CONFLICT (question_id) DO UPDATE
+  SET stats_attempts = s.stats_attempts + excluded.stats_attempts,
+      stats_correct = s.stats_correct + excluded.stats_correct;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_stats_questao ON public.user_history;
+CREATE TRIGGER trigger_stats_questao
+  AFTER INSERT ON public.user_history
+  REFERENCING NEW TABLE AS novas
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION public.incrementar_stats_questao();
+
+-- Carga inicial a partir do estado já materializado (uma vez; o trigger cuida do resto)
+INSERT INTO public.question_stats (question_id, stats_attempts, stats_correct)
+SELECT s.question_id,
+       sum(s.attempts)::int,
+       sum(s.attempts - s.wrong_count)::int
+FROM public.user_question_state s
+JOIN public.questions q ON q.id = s.question_id
+GROUP BY s.question_id
+ON CONFLICT (question_id) DO UPDATE
+SET stats_attempts = excluded.stats_attempts,
+    stats_correct = excluded.stats_correct;
+
+-- Versão anterior guardava os contadores na própria questions
+ALTER TABLE public.questions
+DROP COLUMN IF EXISTS stats_attempts,
+DROP COLUMN IF EXISTS stats_correct;
+
+-- O agregado por questão saiu do caminho quente: o índice dele não é mais usado
+DROP INDEX IF EXISTS public.idx_user_question_state_question;
+
+-- Substituída por esta RPC (o anti-join em user_history não tem mais chamadas)
+DROP FUNCTION IF EXISTS public.get_questoes_ineditas(UUID, BIGINT, TEXT, INT);
+
+-- Índices que ficaram da RPC antiga e continuam em uso: questões da ilha por
+-- nível (candidatas, completar_com_repetidas, estoque do pool) e "já respondeu?"
+-- do usuário para uma lista de questões (sem_ja_respondidas no backend)
+CREATE INDEX IF NOT EXISTS idx_questions_lesson_dificuldade
+ON public.questions(lesson_id, dificuldade);
+
+CREATE INDEX IF NOT EXISTS idx_user_history_user_question
+ON public.user_history(user_id, question_id);
+
+-- 2. RPC colunar
+CREATE OR REPLACE FUNCTION get_candidatas_sessao(
+  p_user_id UUID,
+  p_lesson_id BIGINT
+)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+  WITH q AS (
+    SELECT qq.id, qq.dificuldade,
+           coalesce(st.stats_attempts, 0) AS tentativas,
+           coalesce(st.stats_correct, 0) AS acertos
+    FROM public.questions qq
+    LEFT JOIN public.question_stats st ON st.question_id = qq.id
+    WHERE qq.lesson_id = p_lesson_id
+  ),
+  aluno AS (
+    SELECT s.question_id, s.last_correct, s.last_attempt_at
+    FROM public.user_question_state s
+    JOIN q ON q.id = s.question_id
+    WHERE s.user_id = p_user_id
+  )
+  SELECT jsonb_build_object(
+    'ids',          coalesce(jsonb_agg(q.id ORDER BY q.id), '[]'::jsonb),
+    'dificuldades', coalesce(jsonb_agg(q.dificuldade ORDER BY q.id), '[]'::jsonb),
+    'tentativas',   coalesce(jsonb_agg(q.tentativas ORDER BY q.id), '[]'::jsonb),
+    'acertos',      coalesce(jsonb_agg(q.acertos ORDER BY q.id), '[]'::jsonb),
+    'ultimo',       coalesce(jsonb_agg(a.last_correct ORDER BY q.id), '[]'::jsonb),
+    'dias',         coalesce(jsonb_agg(extract(epoch FROM now() - a.last_attempt_at) / 86400 ORDER BY q.id), '[]'::jsonb),
+    'theta',        coalesce((
+      SELECT h.theta FROM public.user_lesson_ability h
+      WHERE h.user_id = p_user_id AND h.lesson_id = p_lesson_id
+    ), 0)
+  )
+  FROM q
+  LEFT JOIN aluno a ON a.question_id = q.id;
+$$;
+
+ALTER FUNCTION public.get_candidatas_sessao(UUID, BIGINT) SET search_path = public;
+
+COMMENT ON TABLE public.question_stats IS 'Tentativas/acertos globais por questão (trigger_stats_questao em user_history). Lidos por get_candidatas_sessao.';
+COMMENT ON FUNCTION get_candidatas_sessao IS 'Candidatas da ilha em arrays paralelos (ids, dificuldades, tentativas, acertos, ultimo, dias) para o motor de seleção, mais o theta do aluno na ilha. ultimo/dias = null se o aluno nunca viu a questão.';
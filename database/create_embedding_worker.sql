@@ -0,0 +1,113 @@
+-- ==============================================================================
+-- WORKER DE EMBEDDINGS: fila de vetorização do question_bank
+-- Data: 2026-10-17
+-- Descrição: RPCs usadas pelo backend/worker_embeddings.py para processar as
+--            linhas com embedding_status != 'completed' (telemetry_schema.sql).
+--            - reservar_embeddings_pendentes: reserva um lote com
+--              FOR UPDATE SKIP LOCKED + lease (embedding_claimed_at), então
+--              vários workers nunca pegam a mesma linha.
+--            - gravar_embeddings: grava os vetores do lote num único UPDATE.
+--            - marcar_embeddings_falhos: status 'failed' e próxima tentativa
+--              com backoff exponencial (até p_max_tentativas no reservar).
+-- ==============================================================================
+
+-- 1. Colunas de controle da fila
+ALTER TABLE public.question_bank
+ADD COLUMN IF NOT EXISTS embedding_attempts INT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS embedding_next_attempt_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS embedding_claimed_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS embedding_error TEXT;
+
+-- Linhas que já têm vetor (inseridas antes do status existir) não voltam para a fila
+UPDATE public.question_bank
+SET embedding_status = 'completed'
+WHERE embedding IS NOT NULL AND embedding_status IS DISTINCT FROM 'completed';
+
+-- 2. Reserva de um lote (lease de p_lease_segundos: se o worker morrer, a linha volta)
+CREATE OR REPLACE FUNCTION reservar_embeddings_pendentes(
+  p_limite INT,
+  p_lease_segundos INT DEFAULT 300,
+  p_max_tentativas INT DEFAULT 5
+)
+RETURNS TABLE (id UUID, statement TEXT)
+LANGUAGE sql
+AS $$
+  WITH lote AS (
+    SELECT qb.id
+    FROM public.question_bank qb
+    WHERE qb.embedding_status != 'completed'  -- mesmo predicado do idx_embedding_status
+      AND qb.embedding_attempts < p_max_tentativas
+      AND (qb.embedding_next_attempt_at IS NULL OR qb.embedding_next_attempt_at <= NOW())
+      AND (qb.embedding_claimed_at IS NULL
+           OR qb.embedding_claimed_at < NOW() - make_interval(secs => p_lease_segundos))
+    ORDER BY qb.embedding_next_attempt_at NULLS FIRST, qb.created_at
+    LIMIT p_limite
+    FOR UPDATE SKIP LOCKED
+  )
+  UPDATE public.question_bank qb
+  SET embedding_claimed_at = NOW()
+  FROM lote
+  WHERE qb.id = lote.id
+  RETURNING qb.id, qb.statement;
+$$;
+
+-- 3. Gravação em lote: p_itens = [{"id": "...", "embedding": [...]}, ...]
+CREATE OR REPLACE FUNCTION gravar_embeddings(p_itens JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count INTEGER;
+BEGIN
+  UPDATE public.question_bank qb
+  SET embedding = (i->>'embedding')::vector(768),
+      embedding_status = 'completed',
+      embedding_claimed_at = NULL,
+      embedding_next_attempt_at = NULL,
+      embedding_error = NULL
+  FROM jsonb_array_elements(p_itens) AS i
+  WHERE qb.id = (i->>'id')::uuid;
+
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$;
+
+-- 4. Falha: backoff de p_backoff_segundos * 2^tentativas (limitado a p_backoff_max_segundos)
+CREATE OR REPLACE FUNCTION marcar_embeddings_falhos(
+  p_ids UUID[],
+  p_erro TEXT,
+  p_backoff_segundos INT DEFAULT 60,
+  p_backoff_max_segundos INT DEFAULT 21600
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count INTEGER;
+BEGIN
+  UPDATE public.question_bank
+  SET embedding_status = 'failed',
+      embedding_attempts = embedding_attempts + 1,
+      embedding_claimed_at = NULL,
+      embedding_error = left(p_erro, 500),
+      embedding_next_attempt_at = NOW() + make_interval(
+        secs => least(p_backoff_max_segundos, p_backoff_segundos * power(2, embedding_attempts))
+      )
+  WHERE id = ANY(p_ids);
+
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$;
+
+ALTER FUNCTION public.reservar_embeddings_pendentes(INT, INT, INT) SET search_path = public;
+ALTER FUNCTION public.gravar_embeddings(JSONB) SET search_path = public;
+ALTER FUNCTION public.marcar_embeddings_falhos(UUID[], TEXT, INT, INT) SET search_path = public;
+
+COMMENT ON COLUMN public.question_bank.embedding_attempts IS 'Tentativas de vetorização que falharam';
+COMMENT ON COLUMN public.question_bank.embedding_next_attempt_at IS 'Próxima tentativa (backoff exponencial após falha)';
+COMMENT ON COLUMN public.question_bank.embedding_claimed_at IS 'Lease do worker de embeddings (linha reservada)';
+COMMENT ON FUNCTION reservar_embeddings_pendentes IS 'Reserva até p_limite linhas pendentes/falhas (FOR UPDATE SKIP LOCKED + lease). Usada por backend/worker_embeddings.py.';
+COMMENT ON FUNCTION gravar_embeddings IS 'Grava os vetores de um lote e marca as linhas como completed. Retorna o número de linhas atualizadas.';
+COMMENT ON FUNCTION marcar_embeddings_falhos IS 'Marca linhas como failed e agenda nova tentativa com backoff exponencial.';
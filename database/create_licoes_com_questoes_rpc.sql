@@ -0,0 +1,24 @@
+-- ==============================================================================
+-- POVOAMENTO: Quais ilhas já têm questões
+-- Data: 2026-10-17
+-- Descrição: Usada pelo povoar_banco.py para decidir, em UMA consulta, quais
+--            ilhas pular (antes era um SELECT em questions por ilha).
+--            Retorna um array para não esbarrar no limite de 1000 linhas do PostgREST.
+-- ==============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_questions_lesson_id
+ON public.questions(lesson_id);
+
+CREATE OR REPLACE FUNCTION licoes_com_questoes()
+RETURNS BIGINT[]
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT coalesce(array_agg(DISTINCT q.lesson_id::bigint), '{}')
+  FROM public.questions q
+  WHERE q.lesson_id IS NOT NULL;
+$$;
+
+ALTER FUNCTION public.licoes_com_questoes() SET search_path = public;
+
+COMMENT ON FUNCTION licoes_com_questoes IS 'IDs (distintos) das ilhas que já possuem ao menos uma questão.';
@@ -0,0 +1,116 @@
+-- ==============================================================================
+-- CACHE DE RESPOSTAS DA IA (camada persistente)
+-- Data: 2026-10-17
+-- Descrição: Segunda camada do backend/cache_ia.py, no mesmo molde do
+--            rag_cache: SHA-256 do prompt normalizado, expires_at e função de
+--            limpeza. Cada entrada guarda os itens gerados (questões) em
+--            JSONB. Em políticas "consumíveis" a entrada é um estoque: cada
+--            pedido retira itens com consumir_llm_cache (atômico, FOR UPDATE)
+--            e o excedente de uma geração é anexado com
+--            guardar_itens_llm_cache, em vez de ser descartado.
+-- ==============================================================================
+
+-- 1. Tabela
+CREATE TABLE IF NOT EXISTS public.llm_cache (
+  id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+  query_hash TEXT NOT NULL,
+  call_site TEXT NOT NULL,
+  itens JSONB NOT NULL DEFAULT '[]'::jsonb,
+  created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_llm_cache_query_hash
+ON public.llm_cache(query_hash);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at
+ON public.llm_cache(expires_at);
+
+ALTER TABLE public.llm_cache ENABLE ROW LEVEL SECURITY;
+
+-- 2. Grava itens: acumula no estoque (p_acumular) ou substitui a entrada
+CREATE OR REPLACE FUNCTION guardar_itens_llm_cache(
+  p_query_hash TEXT,
+  p_call_site TEXT,
+  p_itens JSONB,
+  p_ttl_segundos INT,
+  p_acumular BOOLEAN DEFAULT true
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+  INSERT INTO public.llm_cache (query_hash, call_site, itens, expires_at)
+  VALUES (p_query_hash, p_call_site, p_itens, NOW() + make_interval(secs => p_ttl_segundos))
+  ON CONFLICT (query_hash) DO UPDATE SET
+    itens = CASE
+      WHEN p_acumular AND llm_cache.expires_at > NOW() THEN llm_cache.itens || EXCLUDED.itens
+      ELSE EXCLUDED.itens
+    END,
+    call_site = EXCLUDED.call_site,
+    created_at = NOW(),
+    expires_at = EXCLUDED.expires_at;
+$$;
+
+-- 3. Retira p_quantidade itens do estoque (tudo ou nada: '[]' se não houver o suficiente)
+CREATE OR REPLACE FUNCTION consumir_llm_cache(
+  p_query_hash TEXT,
+  p_quantidade INT
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_itens JSONB;
+BEGIN
+  SELECT itens INTO v_itens
+  FROM public.llm_cache
+  WHERE query_hash = p_query_hash AND expires_at > NOW()
+  FOR UPDATE;
+
+  IF v_itens IS NULL OR jsonb_array_length(v_itens) < p_quantidade THEN
+    RETURN '[]'::jsonb;
+  END IF;
+
+  UPDATE public.llm_cache
+  SET itens = (
+    SELECT COALESCE(jsonb_agg(e ORDER BY i), '[]'::jsonb)
+    FROM jsonb_array_elements(v_itens) WITH ORDINALITY AS t(e, i)
+    WHERE i > p_quantidade
+  )
+  WHERE query_hash = p_query_hash;
+
+  RETURN (
+    SELECT COALESCE(jsonb_agg(e ORDER BY i), '[]'::jsonb)
+    FROM jsonb_array_elements(v_itens) WITH ORDINALITY AS t(e, i)
+    WHERE i <= p_quantidade
+  );
+END;
+$$;
+
+-- 4. Limpeza (mesmo contrato do cleanup_expired_rag_cache)
+CREATE OR REPLACE FUNCTION cleanup_expired_llm_cache()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  deleted_count INTEGER;
+BEGIN
+  DELETE FROM public.llm_cache
+  WHERE expires_at < NOW();
+
+  GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+  RETURN deleted_count;
+END;
+$$;
+
+ALTER FUNCTION public.guardar_itens_llm_cache(TEXT, TEXT, JSONB, INT, BOOLEAN) SET search_path = public;
+ALTER FUNCTION public.consumir_llm_cache(TEXT, INT) SET search_path = public;
+ALTER FUNCTION public.cleanup_expired_llm_cache() SET search_path = public;
+
+COMMENT ON TABLE public.llm_cache IS 'Cache persistente das respostas do Gemini (backend/cache_ia.py). Itens gerados por prompt normalizado; em políticas consumíveis funciona como estoque de itens ainda não servidos.';
+COMMENT ON COLUMN public.llm_cache.query_hash IS 'SHA-256 do prompt normalizado (minúsculas, espaços colapsados)';
+COMMENT ON COLUMN public.llm_cache.call_site IS 'Política/rota que gerou a entrada (semelhante, ...)';
+COMMENT ON COLUMN public.llm_cache.itens IS 'Itens gerados e ainda não servidos (array JSON)';
+COMMENT ON FUNCTION consumir_llm_cache IS 'Retira p_quantidade itens da entrada de forma atômica. Retorna [] se a entrada não tiver itens suficientes.';
+COMMENT ON FUNCTION cleanup_expired_llm_cache IS 'Removes all expired LLM cache entries. Returns number of deleted rows.';
@@ -0,0 +1,36 @@
+-- ==============================================================================
+-- POOL DE QUESTÕES: Estoque por (ilha, dificuldade)
+-- Data: 2026-10-17
+-- Descrição: RPC usada pelo reabastecedor em background (backend/pool_questoes.py)
+--            para medir quantas questões da ilha ainda são "inéditas para a
+--            maioria", ou seja, respondidas por menos de p_max_usuarios alunos.
+-- ==============================================================================
+
+-- 1. Índice para contar respondentes por questão
+CREATE INDEX IF NOT EXISTS idx_user_history_question_id
+ON public.user_history(question_id);
+
+-- 2. RPC de estoque
+CREATE OR REPLACE FUNCTION contar_estoque_questoes(
+  p_lesson_id BIGINT,
+  p_dificuldade TEXT,
+  p_max_usuarios INT DEFAULT 3
+)
+RETURNS INTEGER
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT count(*)::int
+  FROM public.questions q
+  WHERE q.lesson_id = p_lesson_id
+    AND q.dificuldade = p_dificuldade
+    AND (
+      SELECT count(DISTINCT h.user_id)
+      FROM public.user_history h
+      WHERE h.question_id = q.id
+    ) < p_max_usuarios;
+$$;
+
+ALTER FUNCTION public.contar_estoque_questoes(BIGINT, TEXT, INT) SET search_path = public;
+
+COMMENT ON FUNCTION contar_estoque_questoes IS 'Conta questões da ilha/dificuldade respondidas por menos de p_max_usuarios usuários (estoque do pool de pré-geração).';
@@ -0,0 +1,20 @@
+-- ==============================================================================
+-- DEDUP NA INSERÇÃO: Embeddings das questões do quiz
+-- Data: 2026-10-17
+-- Descrição: Um vector(768) por questão (mesmo modelo/dimensão do
+--            question_bank), mantido pelo backend/deduplicador.py: as questões
+--            geradas pela IA entram com embedding e as antigas são
+--            vetorizadas na primeira vez que a ilha recebe questões novas.
+--            Tabela separada para não inflar os SELECT * de questions com
+--            768 floats por linha.
+-- ==============================================================================
+
+CREATE TABLE IF NOT EXISTS public.question_embeddings (
+  question_id BIGINT PRIMARY KEY REFERENCES public.questions(id) ON DELETE CASCADE,
+  embedding vector(768) NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now()
+);
+
+ALTER TABLE public.question_embeddings ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE public.question_embeddings IS 'Embedding do enunciado de cada questão (gemini-embedding-001, 768 dims). Usado pelo dedup de questões geradas pela IA.';
@@ -0,0 +1,83 @@
+-- ==============================================================================
+-- PROGRESSO: Upsert condicional do nível (só avança, nunca regride)
+-- Data: 2026-10-17
+-- Descrição: O POST /progresso lia o nível, comparava em Python e fazia upsert
+--            (2 idas ao banco + janela de corrida em que saves simultâneos
+--            podiam regredir o nível). Agora é um único INSERT ... ON CONFLICT
+--            DO UPDATE WHERE excluded.nivel_atual > nivel_atual.
+--            A versão em lote atende clientes que sincronizam offline.
+--            Requer a UNIQUE (user_id, lesson_id) já usada pelo upsert antigo.
+-- ==============================================================================
+
+-- 1. Uma ilha
+CREATE OR REPLACE FUNCTION salvar_progresso(
+  p_user_id UUID,
+  p_lesson_id BIGINT,
+  p_nivel INT
+)
+RETURNS JSONB
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH gravado AS (
+    INSERT INTO public.user_progress AS up (user_id, lesson_id, nivel_atual, updated_at)
+    SELECT p_user_id, p_lesson_id, p_nivel, now()
+    WHERE p_nivel > 0
+    ON CONFLICT (user_id, lesson_id) DO UPDATE
+    SET nivel_atual = excluded.nivel_atual,
+        updated_at = excluded.updated_at
+    WHERE excluded.nivel_atual > up.nivel_atual
+    RETURNING up.nivel_atual
+  )
+  SELECT CASE
+    WHEN EXISTS (SELECT 1 FROM gravado)
+      THEN jsonb_build_object('status', 'Atualizado', 'nivel', (SELECT nivel_atual FROM gravado))
+    ELSE jsonb_build_object('status', 'Mantido', 'nivel', coalesce(
+      (SELECT nivel_atual FROM public.user_progress WHERE user_id = p_user_id AND lesson_id = p_lesson_id), 0))
+  END;
+$$;
+
+ALTER FUNCTION public.salvar_progresso(UUID, BIGINT, INT) SET search_path = public;
+
+-- 2. Várias ilhas de uma vez: p_itens = [{"lesson_id": 1, "nivel_novo": 3}, ...]
+--    Ilhas repetidas no lote valem pelo maior nível.
+CREATE OR REPLACE FUNCTION salvar_progresso_lote(
+  p_user_id UUID,
+  p_itens JSONB
+)
+RETURNS JSONB
+LANGUAGE sql
+VOLATILE
+AS $$
+  WITH entrada AS (
+    SELECT (e->>'lesson_id')::bigint AS lesson_id,
+           max((e->>'nivel_novo')::int) AS nivel
+    FROM jsonb_array_elements(p_itens) e
+    GROUP BY 1
+  ),
+  gravados AS (
+    INSERT INTO public.user_progress AS up (user_id, lesson_id, nivel_atual, updated_at)
+    SELECT p_user_id, lesson_id, nivel, now()
+    FROM entrada
+    WHERE nivel > 0
+    ON CONFLICT (user_id, lesson_id) DO UPDATE
+    SET nivel_atual = excluded.nivel_atual,
+        updated_at = excluded.updated_at
+    WHERE excluded.nivel_atual > up.nivel_atual
+    RETURNING up.lesson_id, up.nivel_atual
+  )
+  -- O SELECT enxerga user_progress de ANTES do insert: é o nível das ilhas mantidas
+  SELECT coalesce(jsonb_agg(jsonb_build_object(
+    'lesson_id', e.lesson_id,
+    'status', CASE WHEN g.lesson_id IS NOT NULL THEN 'Atualizado' ELSE 'Mantido' END,
+    'nivel', coalesce(g.nivel_atual, p.nivel_atual, 0)
+  )), '[]'::jsonb)
+  FROM entrada e
+  LEFT JOIN gravados g ON g.lesson_id = e.lesson_id
+  LEFT JOIN public.user_progress p ON p.user_id = p_user_id AND p.lesson_id = e.lesson_id;
+$$;
+
+ALTER FUNCTION public.salvar_progresso_lote(UUID, JSONB) SET search_path = public;
+
+COMMENT ON FUNCTION salvar_progresso IS 'Grava o nível da ilha só se for maior que o atual. Retorna {status: Atualizado|Mantido, nivel}.';
+COMMENT ON FUNCTION salvar_progresso_lote IS 'Versão em lote de salvar_progresso. p_itens = [{lesson_id, nivel_novo}]. Retorna [{lesson_id, status, nivel}].';
@@ -0,0 +1,73 @@
+-- ==============================================================================
+-- SESSÃO ADAPTATIVA: Habilidade estimada por (usuário, ilha)
+-- Data: 2026-10-17
+-- Descrição: Estimativas tipo Elo/1PL usadas pelo backend/habilidade.py.
+--            Um trigger em user_history aplica o passo de cada tentativa
+--            numa única UPDATE (theta += K * (resultado - P(acerto))), então
+--            vários workers e qualquer caminho de gravação do histórico
+--            mantêm a mesma estimativa. O backend lê o theta do par
+--            (aluno, ilha) junto com as candidatas da sessão
+--            (get_candidatas_sessao).
+-- ==============================================================================
+
+CREATE TABLE IF NOT EXISTS public.user_lesson_ability (
+  id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  user_id UUID NOT NULL,
+  lesson_id BIGINT NOT NULL,
+  theta REAL NOT NULL DEFAULT 0,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  UNIQUE (user_id, lesson_id)
+);
+
+ALTER TABLE public.user_lesson_ability ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read their own ability" ON public.user_lesson_ability;
+CREATE POLICY "Users can read their own ability" ON public.user_lesson_ability FOR SELECT USING ((select auth.uid()) = user_id);
+
+-- Passo Elo por tentativa: b = -1/0/1 (Fácil/Médio/Difícil, mesmos valores do
+-- DIFICULDADE_ITEM do backend/habilidade.py), K = max(0.1, 0.6 / sqrt(1 + tentativas))
+CREATE OR REPLACE FUNCTION public.atualizar_user_lesson_ability()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_lesson_id BIGINT;
+  v_b REAL;
+BEGIN
+  SELECT q.lesson_id,
+         CASE q.dificuldade WHEN 'Fácil' THEN -1 WHEN 'Difícil' THEN 1 ELSE 0 END
+  INTO v_lesson_id, v_b
+  FROM public.questions q
+  WHERE q.id = NEW.question_id;
+
+  IF v_lesson_id IS NULL THEN
+    RETURN NEW;
+  END IF;
+
+  INSERT INTO public.user_lesson_ability (user_id, lesson_id)
+  VALUES (NEW.user_id, v_lesson_id)
+  ON CONFLICT (user_id, lesson_id) DO NOTHING;
+
+  -- Lê e escreve theta/attempts na mesma UPDATE: tentativas simultâneas se serializam no lock da linha
+  UPDATE public.user_lesson_ability
+  SET theta = theta + greatest(0.1, 0.6 / sqrt(1 + attempts))
+                    * ((CASE WHEN NEW.is_correct THEN 1 ELSE 0 END) - 1 / (1 + exp(-(theta - v_b)))),
+      attempts = attempts + 1,
+      updated_at = now()
+  WHERE user_id = NEW.user_id AND lesson_id = v_lesson_id;
+
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_user_lesson_ability ON public.user_history;
+CREATE TRIGGER trigger_user_lesson_ability
+  AFTER INSERT ON public.user_history
+  FOR EACH ROW
+  EXECUTE FUNCTION public.atualizar_user_lesson_ability();
+
+COMMENT ON TABLE public.user_lesson_ability IS 'Habilidade (theta, escala logística) do aluno em cada ilha. Atualizada pelo trigger_user_lesson_ability a cada tentativa em user_history.';
+COMMENT ON FUNCTION public.atualizar_user_lesson_ability IS 'Trigger de user_history: aplica o passo Elo/1PL da tentativa em user_lesson_ability (backend/habilidade.py lê o resultado).';
@@ -0,0 +1,109 @@
+-- ==============================================================================
+-- FILA DE REVISÃO: Estado SM-2 por (usuário, questão) do quiz
+-- Data: 2026-10-17
+-- Descrição: Equivalente ao flashcard_srs_state para a tabela questions.
+--            Mantido por um trigger em user_history: cada tentativa
+--            gravada (por qualquer caminho: /historico direto, write-behind,
+--            importações) avança o SM-2 da linha sob lock, sem corrida entre
+--            workers. O GET /revisar/{user_id} lê as questões vencidas por
+--            range scan em (user_id, due_at).
+-- ==============================================================================
+
+CREATE TABLE IF NOT EXISTS public.user_question_srs (
+  user_id UUID NOT NULL,
+  question_id BIGINT NOT NULL,
+
+  -- Estado (mesmos valores do flashcard_srs_state)
+  state TEXT NOT NULL DEFAULT 'new',
+
+  -- Agendamento
+  due_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+  -- Parâmetros SM-2
+  ease_factor DECIMAL NOT NULL DEFAULT 2.5,
+  interval_days DECIMAL NOT NULL DEFAULT 1.0,
+  repetitions INTEGER NOT NULL DEFAULT 0,
+  lapses INTEGER NOT NULL DEFAULT 0,
+
+  last_reviewed_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT now(),
+
+  PRIMARY KEY (user_id, question_id),
+  CONSTRAINT user_question_srs_ease_min CHECK (ease_factor >= 1.3),
+  CONSTRAINT user_question_srs_interval_positive CHECK (interval_days > 0),
+  CONSTRAINT user_question_srs_valid_state CHECK (state IN ('new', 'learning', 'review', 'relearning'))
+);
+
+-- Fila de revisão: vencidas do aluno em ordem de vencimento
+CREATE INDEX IF NOT EXISTS idx_user_question_srs_user_due
+ON public.user_question_srs(user_id, due_at);
+
+ALTER TABLE public.user_question_srs ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read their own question srs" ON public.user_question_srs;
+CREATE POLICY "Users can read their own question srs" ON public.user_question_srs FOR SELECT USING ((select auth.uid()) = user_id);
+
+-- Um passo do SM-2 por tentativa (mesmo algoritmo do frontend/lib/srs-algorithm.ts),
+-- com o resultado binário do quiz mapeado para a escala SM-2:
+--   errou   -> "again" (q=1): volta para 1 dia, conta um lapso
+--   acertou -> "good" (q=4): 1 dia, 6 dias, depois intervalo x ease factor
+CREATE OR REPLACE FUNCTION public.avancar_user_question_srs()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  s public.user_question_srs%ROWTYPE;
+  v_quando TIMESTAMPTZ := coalesce(NEW.created_at, now());
+  v_q INTEGER := 4;  -- qualidade do acerto ("good")
+BEGIN
+  INSERT INTO public.user_question_srs (user_id, question_id)
+  VALUES (NEW.user_id, NEW.question_id)
+  ON CONFLICT (user_id, question_id) DO NOTHING;
+
+  -- Lock da linha: tentativas simultâneas do mesmo par se serializam
+  SELECT * INTO s
+  FROM public.user_question_srs
+  WHERE user_id = NEW.user_id AND question_id = NEW.question_id
+  FOR UPDATE;
+
+  IF NOT NEW.is_correct THEN
+    s.interval_days := 1.0;
+    s.repetitions := 0;
+    s.lapses := s.lapses + 1;
+    s.state := 'relearning';
+  ELSE
+    s.interval_days := CASE s.repetitions
+      WHEN 0 THEN 1.0
+      WHEN 1 THEN 6.0
+      ELSE round(s.interval_days * s.ease_factor)
+    END;
+    s.repetitions := s.repetitions + 1;
+    s.ease_factor := greatest(1.3, s.ease_factor + 0.1 - (5 - v_q) * (0.08 + (5 - v_q) * 0.02));
+    s.state := CASE WHEN s.interval_days >= 21 THEN 'review' ELSE 'learning' END;
+  END IF;
+
+  UPDATE public.user_question_srs
+  SET state = s.state,
+      ease_factor = s.ease_factor,
+      interval_days = s.interval_days,
+      repetitions = s.repetitions,
+      lapses = s.lapses,
+      due_at = v_quando + make_interval(days => ceil(s.interval_days)::int),
+      last_reviewed_at = v_quando,
+      updated_at = now()
+  WHERE user_id = NEW.user_id AND question_id = NEW.question_id;
+
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_user_question_srs ON public.user_history;
+CREATE TRIGGER trigger_user_question_srs
+  AFTER INSERT ON public.user_history
+  FOR EACH ROW
+  EXECUTE FUNCTION public.avancar_user_question_srs();
+
+COMMENT ON TABLE public.user_question_srs IS 'Estado SM-2 de cada questão do quiz por usuário. Atualizado pelo trigger_user_question_srs a cada tentativa em user_history.';
+COMMENT ON FUNCTION public.avancar_user_question_srs IS 'Trigger de user_history: avança o SM-2 da questão (errou = again, acertou = good) e agenda due_at.';
@@ -0,0 +1,113 @@
+-- ==============================================================================
+-- CADERNO DE ERROS: Estado materializado por (usuário, questão)
+-- Data: 2026-10-17
+-- Descrição: Cada tentativa gravada em user_history atualiza uma linha de
+--            estado da questão para o aluno (último resultado, primeiro e
+--            último erro, nº de tentativas). O GET /erros/{user_id} vira uma
+--            consulta por faixa num índice, correta para o histórico inteiro
+--            e proporcional ao número de erros (não ao de tentativas).
+-- ==============================================================================
+
+-- 1. Tabela de estado
+CREATE TABLE IF NOT EXISTS public.user_question_state (
+  user_id UUID NOT NULL,
+  question_id BIGINT NOT NULL,
+  last_correct BOOLEAN NOT NULL,
+  last_attempt_at TIMESTAMPTZ NOT NULL,
+  first_wrong_at TIMESTAMPTZ,
+  last_wrong_at TIMESTAMPTZ,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  wrong_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, question_id)
+);
+
+-- Listagem de erros: só as questões que o aluno já errou, da mais recente para a mais antiga.
+-- question_id desempata erros com o mesmo last_wrong_at (cursor composto do /erros).
+DROP INDEX IF EXISTS public.idx_user_question_state_erros;
+CREATE INDEX idx_user_question_state_erros
+ON public.user_question_state(user_id, last_wrong_at DESC, question_id DESC)
+WHERE last_wrong_at IS NOT NULL;
+
+ALTER TABLE public.user_question_state ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read their own question state" ON public.user_question_state;
+CREATE POLICY "Users can read their own question state" ON public.user_question_state FOR SELECT USING ((select auth.uid()) = user_id);
+
+-- 2. Atualização incremental: trigger em cada tentativa registrada
+--    O write-behind do /historico pode gravar fora de ordem: o "último resultado"
+--    só é trocado se a tentativa for mais nova do que a que já está no estado.
+CREATE OR REPLACE FUNCTION public.atualizar_user_question_state()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_quando TIMESTAMPTZ := coalesce(NEW.created_at, now());
+  v_erro TIMESTAMPTZ := CASE WHEN NEW.is_correct THEN NULL ELSE coalesce(NEW.created_at, now()) END;
+BEGIN
+  INSERT INTO public.user_question_state AS s
+    (user_id, question_id, last_correct, last_attempt_at, first_wrong_at, last_wrong_at, attempts, wrong_count)
+  VALUES (
+    NEW.user_id, NEW.question_id, NEW.is_correct, v_quando, v_erro, v_erro,
+    1, CASE WHEN NEW.is_correct THEN 0 ELSE 1 END
+  )
+  ON CONFLICT (user_id, question_id) DO UPDATE
+  SET attempts = s.attempts + 1,
+      wrong_count = s.wrong_count + excluded.wrong_count,
+      last_correct = CASE WHEN excluded.last_attempt_at >= s.last_attempt_at
+                          THEN excluded.last_correct ELSE s.last_correct END,
+      last_attempt_at = greatest(s.last_attempt_at, excluded.last_attempt_at),
+      first_wrong_at = least(s.first_wrong_at, excluded.first_wrong_at),
+      last_wrong_at = greatest(s.last_wrong_at, excluded.last_wrong_at);
+
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_user_question_state ON public.user_history;
+CREATE TRIGGER trigger_user_question_state
+  AFTER INSERT ON public.user_history
+  FOR EACH ROW
+  EXECUTE FUNCTION public.atualizar_user_question_state();
+
+-- 3. Backfill: recalcula (substitui) o estado das questões com id em [p_de, p_ate)
+--    Fatiar por questão garante que todas as tentativas de um par (usuário, questão)
+--    caem na mesma janela. Rodado pelo backend/backfill_erros.py.
+CREATE OR REPLACE FUNCTION public.backfill_user_question_state(p_de BIGINT, p_ate BIGINT)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_linhas INTEGER;
+BEGIN
+  INSERT INTO public.user_question_state AS s
+    (user_id, question_id, last_correct, last_attempt_at, first_wrong_at, last_wrong_at, attempts, wrong_count)
+  SELECT h.user_id,
+         h.question_id,
+         (array_agg(h.is_correct ORDER BY h.created_at DESC))[1],
+         max(h.created_at),
+         min(h.created_at) FILTER (WHERE NOT h.is_correct),
+         max(h.created_at) FILTER (WHERE NOT h.is_correct),
+         count(*)::int,
+         (count(*) FILTER (WHERE NOT h.is_correct))::int
+  FROM public.user_history h
+  WHERE h.question_id >= p_de AND h.question_id < p_ate
+  GROUP BY h.user_id, h.question_id
+  ON CONFLICT (user_id, question_id) DO UPDATE
+  SET last_correct = excluded.last_correct,
+      last_attempt_at = excluded.last_attempt_at,
+      first_wrong_at = excluded.first_wrong_at,
+      last_wrong_at = excluded.last_wrong_at,
+      attempts = excluded.attempts,
+      wrong_count = excluded.wrong_count;
+
+  GET DIAGNOSTICS v_linhas = ROW_COUNT;
+  RETURN v_linhas;
+END;
+$$;
+
+COMMENT ON TABLE public.user_question_state IS 'Estado de cada questão por usuário (último resultado, erros, tentativas). Mantido pelo trigger trigger_user_question_state em user_history.';
+COMMENT ON FUNCTION public.backfill_user_question_state IS 'Recalcula o estado das questões com id em [p_de, p_ate) a partir de user_history. Retorna o número de linhas gravadas.';
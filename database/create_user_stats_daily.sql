@@ -0,0 +1,137 @@
+-- ==============================================================================
+-- PERFIL: Rollup diário de estatísticas por (usuário, dia, sistema)
+-- Data: 2026-10-17
+-- Descrição: Cada tentativa gravada em user_history incrementa um balde diário.
+--            O /perfil/stats passa a somar no máximo (dias x sistemas) linhas,
+--            em vez de varrer todas as tentativas do usuário.
+--            Dia = data UTC de created_at. system_id 0 = "Geral" (sem hierarquia).
+-- ==============================================================================
+
+-- 1. Tabela de rollup
+CREATE TABLE IF NOT EXISTS public.user_stats_daily (
+  user_id UUID NOT NULL,
+  dia DATE NOT NULL,
+  system_id BIGINT NOT NULL DEFAULT 0,
+  total INTEGER NOT NULL DEFAULT 0,
+  acertos INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, dia, system_id)
+);
+
+ALTER TABLE public.user_stats_daily ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read their own daily stats" ON public.user_stats_daily;
+CREATE POLICY "Users can read their own daily stats" ON public.user_stats_daily FOR SELECT USING ((select auth.uid()) = user_id);
+
+-- 2. Atualização incremental: trigger em cada tentativa registrada
+CREATE OR REPLACE FUNCTION public.incrementar_user_stats_daily()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_system_id BIGINT;
+BEGIN
+  SELECT m.system_id INTO v_system_id
+  FROM public.questions q
+  JOIN public.lessons l ON l.id = q.lesson_id
+  JOIN public.modules m ON m.id = l.module_id
+  WHERE q.id = NEW.question_id;
+
+  INSERT INTO public.user_stats_daily AS s (user_id, dia, system_id, total, acertos)
+  VALUES (
+    NEW.user_id,
+    (coalesce(NEW.created_at, now()) AT TIME ZONE 'UTC')::date,
+    coalesce(v_system_id, 0),
+    1,
+    CASE WHEN NEW.is_correct THEN 1 ELSE 0 END
+  )
+  ON CONFLICT (user_id, dia, system_id) DO UPDATE
+  SET total = s.total + 1,
+      acertos = s.acertos + excluded.acertos;
+
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trigger_user_stats_daily ON public.user_history;
+CREATE TRIGGER trigger_user_stats_daily
+  AFTER INSERT ON public.user_history
+  FOR EACH ROW
+  EXECUTE FUNCTION public.incrementar_user_stats_daily();
+
+-- 3. Backfill: recalcula (substitui) os baldes de uma janela de dias [p_desde, p_ate)
+--    Rodado em janelas pelo backend/backfill_stats.py para não estourar o statement timeout.
+CREATE OR REPLACE FUNCTION public.backfill_user_stats_daily(p_desde DATE, p_ate DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_linhas INTEGER;
+BEGIN
+  DELETE FROM public.user_stats_daily
+  WHERE dia >= p_desde AND dia < p_ate;
+
+  INSERT INTO public.user_stats_daily (user_id, dia, system_id, total, acertos)
+  SELECT h.user_id,
+         (h.created_at AT TIME ZONE 'UTC')::date AS dia,
+         coalesce(m.system_id, 0) AS system_id,
+         count(*)::int,
+         (count(*) FILTER (WHERE h.is_correct))::int
+  FROM public.user_history h
+  LEFT JOIN public.questions q ON q.id = h.question_id
+  LEFT JOIN public.lessons l ON l.id = q.lesson_id
+  LEFT JOIN public.modules m ON m.id = l.module_id
+  WHERE h.created_at >= p_desde::timestamp AT TIME ZONE 'UTC'
+    AND h.created_at < p_ate::timestamp AT TIME ZONE 'UTC'
+  GROUP BY 1, 2, 3;
+
+  GET DIAGNOSTICS v_linhas = ROW_COUNT;
+  RETURN v_linhas;
+END;
+$$;
+
+-- 4. Leitura: soma dos baldes do período [p_inicio, p_fim) (mesmo formato da antiga get_user_stats_agregado)
+CREATE OR REPLACE FUNCTION public.get_user_stats_rollup(
+  p_user_id UUID,
+  p_inicio DATE DEFAULT NULL,
+  p_fim DATE DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH por_sistema AS (
+    SELECT coalesce(sy.nome, 'Geral') AS sistema,
+           sum(d.total)::int AS total,
+           sum(d.acertos)::int AS acertos
+    FROM public.user_stats_daily d
+    LEFT JOIN public.systems sy ON sy.id = d.system_id
+    WHERE d.user_id = p_user_id
+      AND (p_inicio IS NULL OR d.dia >= p_inicio)
+      AND (p_fim IS NULL OR d.dia < p_fim)
+    GROUP BY 1
+  )
+  SELECT jsonb_build_object(
+    'total', coalesce(sum(ps.total), 0)::int,
+    'acertos', coalesce(sum(ps.acertos), 0)::int,
+    'total_vitalicio', (SELECT coalesce(sum(d.total), 0)::int FROM public.user_stats_daily d WHERE d.user_id = p_user_id),
+    'por_sistema', coalesce(
+      jsonb_object_agg(ps.sistema, jsonb_build_object('total', ps.total, 'acertos', ps.acertos)),
+      '{}'::jsonb
+    )
+  )
+  FROM por_sistema ps;
+$$;
+
+-- 5. Substituída pelo rollup: a RPC que agregava view_historico_completo e o
+--    índice (user_id, created_at) que ela usava não têm mais chamadas
+DROP FUNCTION IF EXISTS public.get_user_stats_agregado(UUID, TIMESTAMPTZ, TIMESTAMPTZ);
+DROP INDEX IF EXISTS public.idx_user_history_user_created;
+
+COMMENT ON TABLE public.user_stats_daily IS 'Rollup diário de tentativas por usuário/sistema. Mantido pelo trigger trigger_user_stats_daily em user_history.';
+COMMENT ON FUNCTION public.backfill_user_stats_daily IS 'Recalcula os baldes dos dias [p_desde, p_ate) a partir de user_history. Retorna o número de baldes gravados.';
+COMMENT ON FUNCTION public.get_user_stats_rollup IS 'Estatísticas do usuário somando os baldes diários do período [p_inicio, p_fim). NULL = sem limite.';